@@ -1,3 +1,4 @@
-from .encryption import Encrypter
+from .encryption import Encrypter, MODE_CBC, MODE_GCM, MODE_GCM_SEGMENTED
 from .decryption import Decrypter
-from .key_generation import KeyGeneration
\ No newline at end of file
+from .key_generation import KeyGeneration
+from .keystore import KeyStore
@@ -4,18 +4,108 @@ from Crypto.Cipher import AES
 import os
 import os.path
 
+from Monitoring import stego as metrics
+
+from .encryption import (HEADER_MAGIC, MODE_IDS, MODE_GCM, MODE_GCM_SEGMENTED, GCM_NONCE_SIZE,
+                         GCM_TAG_SIZE, PAYLOAD_KEY, SEGMENT_PREFIX, SEGMENT_AAD, segment_nonce, run_segments)
+
+
+def segment_sealed_size(prefix):
+    size = SEGMENT_PREFIX.unpack_from(prefix, len(HEADER_MAGIC) + 1)[0]
+    if size == 0:
+        raise ValueError("Invalid GCM segment size")
+    return size + GCM_TAG_SIZE
+
+
+def open_segment(key, prefix, index, last, segment):
+    if len(segment) < GCM_TAG_SIZE:
+        raise ValueError("Truncated GCM payload")
+    cipher = AES.new(key, AES.MODE_GCM, nonce=segment_nonce(prefix[-(GCM_NONCE_SIZE - 4):], index))
+    cipher.update(prefix + SEGMENT_AAD.pack(index, last))
+    return cipher.decrypt_and_verify(segment[:-GCM_TAG_SIZE], segment[-GCM_TAG_SIZE:])
+
 
 class Decrypter:
-    def __init__(self, key):
+    def __init__(self, key, workers=None):
         self.key = key
+        self.workers = workers
 
     def decrypt(self, ciphertext):
-        key = b'[EX\xc8\xd5\xbfI{\xa2$\x05(\xd5\x18\xbf\xc0\x85)\x10nc\x94\x02)j\xdf\xcb\xc4\x94\x9d(\x9e'
+        metrics.CRYPTO_BYTES.labels("decrypt").inc(len(ciphertext))
+        with metrics.errors("decrypt"), metrics.STAGE_SECONDS.time("decrypt"):
+            plaintext = self.decrypt_payload(ciphertext)
+        metrics.OPERATIONS.labels("decrypt", "ok").inc()
+        return plaintext
+
+    def decrypt_payload(self, ciphertext):
+        key = PAYLOAD_KEY
+        ciphertext = bytes(ciphertext)
+        header_size = len(HEADER_MAGIC) + 1
+        if ciphertext[:len(HEADER_MAGIC)] == HEADER_MAGIC and len(ciphertext) > header_size:
+            if ciphertext[len(HEADER_MAGIC)] == MODE_IDS[MODE_GCM]:
+                return self.decrypt_gcm(key, ciphertext[:header_size], ciphertext[header_size:])
+            if ciphertext[len(HEADER_MAGIC)] == MODE_IDS[MODE_GCM_SEGMENTED]:
+                return self.decrypt_segmented(key, ciphertext)
         iv = ciphertext[:AES.block_size]
         cipher = AES.new(key, AES.MODE_CBC, iv)
         plaintext = cipher.decrypt(ciphertext[AES.block_size:])
         return plaintext.rstrip(b"\0")
 
+    def decrypt_gcm(self, key, header, body):
+        # Raises ValueError if the payload or its header was tampered with
+        if len(body) < GCM_NONCE_SIZE + GCM_TAG_SIZE:
+            raise ValueError("Truncated GCM payload")
+        nonce = body[:GCM_NONCE_SIZE]
+        tag = body[-GCM_TAG_SIZE:]
+        cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
+        cipher.update(header)
+        return cipher.decrypt_and_verify(body[GCM_NONCE_SIZE:-GCM_TAG_SIZE], tag)
+
+    def decrypt_segmented(self, key, ciphertext):
+        # Raises ValueError if any segment was tampered with, reordered or
+        # dropped
+        prefix_size = len(HEADER_MAGIC) + 1 + SEGMENT_PREFIX.size
+        if len(ciphertext) < prefix_size + GCM_TAG_SIZE:
+            raise ValueError("Truncated GCM payload")
+        prefix = ciphertext[:prefix_size]
+        sealed = segment_sealed_size(prefix)
+        body = memoryview(ciphertext)[prefix_size:]
+        count = max(1, -(-len(body) // sealed))
+
+        def open_one(index):
+            return open_segment(key, prefix, index, index == count - 1, body[index * sealed:(index + 1) * sealed])
+
+        return b"".join(run_segments(open_one, count, self.workers))
+
+    def decrypt_stream(self, chunks):
+        # Inverse of Encrypter.encrypt_stream: yields plaintext segment by
+        # segment from an iterable of ciphertext chunks of any size.  Like
+        # decrypt(), raises ValueError on tampering, but only when the bad
+        # segment is reached, so callers must discard earlier output.
+        prefix_size = len(HEADER_MAGIC) + 1 + SEGMENT_PREFIX.size
+        pending = bytearray()
+        prefix = None
+        index = 0
+        for chunk in chunks:
+            metrics.CRYPTO_BYTES.labels("decrypt").inc(len(chunk))
+            pending += chunk
+            if prefix is None:
+                if len(pending) < prefix_size:
+                    continue
+                prefix = bytes(pending[:prefix_size])
+                del pending[:prefix_size]
+                if prefix[:len(HEADER_MAGIC) + 1] != HEADER_MAGIC + bytes([MODE_IDS[MODE_GCM_SEGMENTED]]):
+                    raise ValueError("Not a segmented GCM payload")
+                sealed = segment_sealed_size(prefix)
+            # hold back at least one segment, it may be the last
+            while len(pending) > sealed:
+                yield open_segment(PAYLOAD_KEY, prefix, index, False, bytes(pending[:sealed]))
+                del pending[:sealed]
+                index += 1
+        if prefix is None:
+            raise ValueError("Truncated GCM payload")
+        yield open_segment(PAYLOAD_KEY, prefix, index, True, bytes(pending))
+
     def decrypt_file(self, file_name):
         with open(file_name, 'rb') as fo:
             ciphertext = fo.read()
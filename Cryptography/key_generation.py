@@ -3,14 +3,35 @@
 import os
 import os.path
 from Cryptography import Encrypter
+from Cryptography import Decrypter
+from .keystore import KeyStore
+
+KEYSTORE_NAME = "keystore.db"
+
 
 class KeyGeneration:
+    # Key files are addressed as <key directory>/<key name>, as before, but
+    # every key in a directory now lives in that directory's keystore.db.
+    def keystore(keyfile):
+        return KeyStore.open(os.path.join(os.path.dirname(keyfile), KEYSTORE_NAME))
+
     def createkeyfile(keyfile, keyvalue):
-        f = open(keyfile + ".txt", "w+")
-        f.write(keyvalue)
-        f.close()
-        key = b'[EX\xc8\xd5\xbfI{\xa2$\x05(\xd5\x18\xbf\xc0\x85)\x10nc\x94\x02)j\xdf\xcb\xc4\x94\x9d(\x9e'
-        Encrypter(key).encrypt_file(keyfile + ".txt")
+        return KeyGeneration.keystore(keyfile).add(os.path.basename(keyfile), keyvalue)
+
+    def verifykey(keyfile, keyvalue):
+        store = KeyGeneration.keystore(keyfile)
+        name = os.path.basename(keyfile)
+        if store.contains(name):
+            return store.verify(name, keyvalue)
+
+        # keys generated before the keystore existed are checked against
+        # their .txt.enc file once and migrated on success
+        if not os.path.exists(keyfile + ".txt.enc"):
+            return False
+        stored = Decrypter("").decrypt_file(keyfile + ".txt.enc")
+        if stored.decode("utf-8") != keyvalue:
+            return False
+        store.add(name, keyvalue)
         return True
 
     def createplaintextfile(plaintextfilename, plaintext):
@@ -22,6 +43,8 @@ class KeyGeneration:
         return "PlainText File Generated."
 
     def checkforfileexist(filename):
+        if KeyGeneration.keystore(filename).contains(os.path.basename(filename)):
+            return True
         is_exist = os.path.exists(filename + ".txt.enc")
         return is_exist
 
@@ -0,0 +1,181 @@
+# Single file key store
+#
+# Every key is stored as a fixed size slot in one memory-mapped file.  Slots
+# are addressed by an open-addressing hash table on the BLAKE2b digest of
+# the key name, so a lookup touches one or two slots no matter how many keys
+# exist.  The key value itself is never written: each slot holds a random
+# salt and a PBKDF2 verifier derived from the value, so checking a key
+# means re-deriving the verifier rather than decrypting a stored secret.
+#
+# A store file belongs to one process at a time: the slot count and used
+# count are cached in memory, and grow() swaps in a new file, which other
+# processes holding the old mapping would not see.  Within a process all
+# access goes through the lock and KeyStore.open shares one instance.
+import hashlib
+import hmac
+import mmap
+import os
+import os.path
+import struct
+import threading
+
+
+class KeyStore:
+    MAGIC = b"SGKS"
+    VERSION = 1
+    # magic, version, slot count, used slots
+    HEADER = struct.Struct("<4sHxxII")
+    HEADER_SIZE = 64
+    # state, iterations, name digest, salt, verifier
+    SLOT = struct.Struct("<B3xI32s16s32s")
+    SLOT_SIZE = 96
+
+    EMPTY = 0
+    USED = 1
+
+    INITIAL_SLOTS = 1024
+    MAX_LOAD = 0.7
+    ITERATIONS = 200_000
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        # name digest -> (verifier, keyed fast hash of the verified value)
+        self.verified = {}
+        if not os.path.exists(path):
+            self.create(path, self.INITIAL_SLOTS)
+        self.map_file()
+
+    @classmethod
+    def open(cls, path):
+        # One instance per file so the verified-key cache is shared
+        path = os.path.abspath(path)
+        with cls._instances_lock:
+            if path not in cls._instances:
+                cls._instances[path] = cls(path)
+            return cls._instances[path]
+
+    @classmethod
+    def create(cls, path, slot_count):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "wb") as fo:
+            fo.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, slot_count, 0).ljust(cls.HEADER_SIZE, b"\0"))
+            fo.truncate(cls.HEADER_SIZE + slot_count * cls.SLOT_SIZE)
+
+    def map_file(self):
+        self.file = open(self.path, "r+b")
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        magic, version, self.slot_count, self.used = self.HEADER.unpack_from(self.map, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError("Not a key store: " + self.path)
+
+    def close(self):
+        with self.lock:
+            self.map.flush()
+            self.map.close()
+            self.file.close()
+
+    @staticmethod
+    def digest(name):
+        return hashlib.blake2b(name.encode("utf-8"), digest_size=32).digest()
+
+    def derive(self, value, salt, iterations):
+        return hashlib.pbkdf2_hmac("sha256", value.encode("utf-8"), salt, iterations)
+
+    @staticmethod
+    def fast_hash(value, salt):
+        return hashlib.blake2b(value.encode("utf-8"), key=salt, digest_size=32).digest()
+
+    def slot_offset(self, index):
+        return self.HEADER_SIZE + index * self.SLOT_SIZE
+
+    def find(self, name_digest):
+        # Returns (slot index, slot tuple or None for a free slot)
+        index = int.from_bytes(name_digest[:8], "little") % self.slot_count
+        while True:
+            slot = self.SLOT.unpack_from(self.map, self.slot_offset(index))
+            if slot[0] == self.EMPTY:
+                return index, None
+            if slot[2] == name_digest:
+                return index, slot
+            index = (index + 1) % self.slot_count
+
+    def write_slot(self, index, name_digest, salt, verifier, iterations):
+        self.SLOT.pack_into(self.map, self.slot_offset(index), self.USED, iterations, name_digest, salt, verifier)
+
+    def write_header(self):
+        self.HEADER.pack_into(self.map, 0, self.MAGIC, self.VERSION, self.slot_count, self.used)
+
+    def grow(self):
+        # Rehash every slot into a file twice the size and swap it in only
+        # once it is complete and fsynced, so a crash at any point leaves
+        # either the old store or the new one on disk, never a partial one
+        slots = []
+        for index in range(self.slot_count):
+            slot = self.SLOT.unpack_from(self.map, self.slot_offset(index))
+            if slot[0] == self.USED:
+                slots.append(slot)
+
+        slot_count = self.slot_count * 2
+        tmp_path = self.path + ".tmp"
+        self.create(tmp_path, slot_count)
+        with open(tmp_path, "r+b") as fo, mmap.mmap(fo.fileno(), 0) as target:
+            for slot in slots:
+                index = int.from_bytes(slot[2][:8], "little") % slot_count
+                while self.SLOT.unpack_from(target, self.slot_offset(index))[0] != self.EMPTY:
+                    index = (index + 1) % slot_count
+                self.SLOT.pack_into(target, self.slot_offset(index), *slot)
+            self.HEADER.pack_into(target, 0, self.MAGIC, self.VERSION, slot_count, len(slots))
+            target.flush()
+            os.fsync(fo.fileno())
+
+        self.map.close()
+        self.file.close()
+        os.replace(tmp_path, self.path)
+        self.map_file()
+
+    def add(self, name, value):
+        name_digest = self.digest(name)
+        salt = os.urandom(16)
+        verifier = self.derive(value, salt, self.ITERATIONS)
+        with self.lock:
+            index, slot = self.find(name_digest)
+            if slot is None:
+                if self.used + 1 > self.slot_count * self.MAX_LOAD:
+                    self.grow()
+                    index, slot = self.find(name_digest)
+                self.used += 1
+                self.write_header()
+            self.write_slot(index, name_digest, salt, verifier, self.ITERATIONS)
+            self.map.flush()
+            self.verified[name_digest] = (verifier, self.fast_hash(value, salt))
+        return True
+
+    def contains(self, name):
+        with self.lock:
+            return self.find(self.digest(name))[1] is not None
+
+    def verify(self, name, value):
+        name_digest = self.digest(name)
+        with self.lock:
+            slot = self.find(name_digest)[1]
+        if slot is None:
+            return False
+        state, iterations, name_digest, salt, verifier = slot
+
+        cached = self.verified.get(name_digest)
+        if cached is not None and cached[0] == verifier:
+            return hmac.compare_digest(cached[1], self.fast_hash(value, salt))
+
+        if not hmac.compare_digest(verifier, self.derive(value, salt, iterations)):
+            return False
+        self.verified[name_digest] = (verifier, self.fast_hash(value, salt))
+        return True
+
+    def __len__(self):
+        return self.used
@@ -1,17 +1,30 @@
 from flet import *
 from functools import partial
-import pika
+import threading
+from JobQueue import AMQPBroker
 
 class ModernNavBar(UserControl):
+    # shared by every nav bar so clicks reuse pooled connections
+    broker = None
+    broker_lock = threading.Lock()
+
     def __init__(self, func):
         self.func = func
         super().__init__()
 
     def handle_home_screen(self):
-        connection = pika.BlockingConnection(pika.ConnectionParameters('localhost'))
-        channel = connection.channel()
-        channel.queue_declare(queue='update_ui')
-        channel.basic_publish(exchange='', routing_key='update_ui', body='HOME')
+        # published off the UI thread and without retries, so a broker that
+        # is down costs one failed connect in the background, not a freeze
+        threading.Thread(target=self.publish_home, daemon=True).start()
+
+    def publish_home(self):
+        try:
+            with ModernNavBar.broker_lock:
+                if ModernNavBar.broker is None:
+                    ModernNavBar.broker = AMQPBroker('localhost', pool_size=1, durable=False, retries=0)
+            ModernNavBar.broker.publish('update_ui', 'HOME')
+        except Exception as error:
+            print("Could not publish HOME to the broker:", error)
 
     def highlight_container(self, e):
         if e.data == "true":
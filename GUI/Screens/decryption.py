@@ -59,26 +59,48 @@ class Decryption:
                 self.response_message.update()
                 return
 
-            key = f"C:\secret\key\{self.key_file_name.value}.txt.enc"
+            key = f"C:\secret\key\{self.key_file_name.value}"
 
             # check existance of key file
-            if not os.path.exists(key):
+            if not Cryptography.KeyGeneration.checkforfileexist(key):
                 self.response_message.value = "Key File is not found!, If not generate please generate it!"
                 self.response_message.color = ft.colors.RED_ACCENT
                 self.response_message.update()
                 return
 
-            data_from_enc_file = Cryptography.Decrypter("").decrypt_file(key)
-            if data_from_enc_file.decode("utf-8") != self.key_data.value:
+            if not Cryptography.KeyGeneration.verifykey(key, self.key_data.value):
                 self.response_message.value = "Key Value is not Correct"
                 self.response_message.color = ft.colors.RED_ACCENT
                 self.response_message.update()
                 return
 
+            # file payloads are streamed straight to disk, not into the text field
+            try:
+                saved_path = Steganography.FilePayload.decode(
+                    self.image_file_path, fr"C:\secret\output", Cryptography.Decrypter(""))
+            except ValueError:
+                self.response_message.value = "Hidden data failed authentication!"
+                self.response_message.color = ft.colors.RED_ACCENT
+                self.response_message.update()
+                return
+            if saved_path is not None:
+                self.output_window.value = ""
+                self.output_window.update()
+                self.response_message.value = f"Decrypted! Saved {saved_path} ({os.path.getsize(saved_path)} bytes)"
+                self.response_message.color = ft.colors.GREEN_ACCENT
+                self.response_message.update()
+                return
+
             encrypted_data = Steganography.Decoding.decode(self.image_file_path)
             decoded = base64.b64decode(encrypted_data)
 
-            plain_text = Cryptography.Decrypter("").decrypt(decoded)
+            try:
+                plain_text = Cryptography.Decrypter("").decrypt(decoded)
+            except ValueError:
+                self.response_message.value = "Hidden data failed authentication!"
+                self.response_message.color = ft.colors.RED_ACCENT
+                self.response_message.update()
+                return
             self.output_window.value = plain_text.decode("utf-8")
             self.output_window.update()
 
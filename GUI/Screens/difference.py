@@ -1,9 +1,9 @@
 import flet as ft
+import base64
 
 import Cryptography
 from GUI.Constants import TextStyle
-import cv2
-from Steganography import DifferenceStego
+from Steganography import DifferenceStego, SampledMetrics, Steganalysis, TiledMetrics
 
 
 class Difference:
@@ -24,10 +24,34 @@ class Difference:
         "",
         color=ft.colors.WHITE,
     )
+    detectability = ft.Text(
+        "",
+        color=ft.colors.WHITE,
+    )
     response_message = ft.Text(
         "",
         color=ft.colors.GREEN_ACCENT,
     )
+    heatmap_kind = ft.Dropdown(
+        label="Heatmap",
+        width=500.0,
+        value="lsb",
+        border_color=ft.colors.INDIGO_200,
+        options=[
+            ft.dropdown.Option("lsb", "LSB Difference"),
+            ft.dropdown.Option("ssim", "SSIM Dissimilarity"),
+        ],
+    )
+    quick_preview = ft.Checkbox(
+        label="Quick preview (sampled estimate)",
+        value=False,
+    )
+    heatmap = ft.Image(
+        width=480.0,
+        height=320.0,
+        fit=ft.ImageFit.CONTAIN,
+        visible=False,
+    )
 
     information = "Choose Both Original & Stego Image to find difference between both images..."
     original_image_path = ""
@@ -50,19 +74,41 @@ class Difference:
             self.response_message.color = ft.colors.WHITE
             self.response_message.update()
 
-            original = cv2.imread(self.original_image_path)
-            compressed = cv2.imread(self.stego_image_path, 1)
+            original = DifferenceStego.loadImage(self.original_image_path)
+            compressed = DifferenceStego.loadImage(self.stego_image_path)
 
-            value = DifferenceStego.calculatePSNR(original, compressed)
-            value2 = DifferenceStego.calculateMSE(original, compressed)
-            value3 = DifferenceStego.calculateSSIM(original, compressed)
+            if self.quick_preview.value:
+                # sampled windows within a quarter second, with 95% intervals
+                metrics = SampledMetrics(time_budget=0.25).estimate(original, compressed)
+                interval = metrics["interval"]
+                value = "{:.3f} ({:.3f} - {:.3f})".format(metrics["psnr"], *interval["psnr"])
+                value2 = "{:.5f} ({:.5f} - {:.5f})".format(metrics["mse"], *interval["mse"])
+                value3 = "{:.5f} ({:.5f} - {:.5f})".format(metrics["ssim"], *interval["ssim"])
+            else:
+                # tiled engine keeps the float working set bounded by tile size
+                metrics = TiledMetrics().compare(original, compressed)
+                value = metrics["psnr"]
+                value2 = metrics["mse"]
+                value3 = metrics["ssim"]
+            # blind chi-square / RS check of the stego image on its own
+            analysis = Steganalysis.analyze(compressed)
+            # only the downsampled PNG reaches the page, never the full map
+            png = DifferenceStego.calculateHeatmap(
+                original, compressed, kind=self.heatmap_kind.value
+            )
+            self.heatmap.src_base64 = base64.b64encode(png).decode()
+            self.heatmap.visible = True
             # print(type(value))
             self.psnr.value = "PSNR: " + str(value)
             self.mse.value = "MSE: " + str(value2)
             self.ssim.value = "SSIM: " + str(value3)
+            self.detectability.value = "Detectability: {:.3f} (chi-square p {:.3f}, RS rate {:.3f})".format(
+                analysis["score"], analysis["chi_square"], analysis["rs"])
             self.psnr.update()
             self.ssim.update()
             self.mse.update()
+            self.detectability.update()
+            self.heatmap.update()
             # print(f"PSNR value is {value} unit")
             # print(f"MSE value is {value2} unit")
             # print(f"SSIM value is {value3} unit")
@@ -134,11 +180,15 @@ class Difference:
                             ],
                         ),
                     ),
+                    self.heatmap_kind,
+                    self.quick_preview,
                     ft.FilledButton(text="Calculate", on_click=handle_calculate_event),
                     self.response_message,
                     self.psnr,
                     self.mse,
                     self.ssim,
+                    self.detectability,
+                    self.heatmap,
                 ],
                 alignment=ft.alignment.top_left,
                 expand=True,
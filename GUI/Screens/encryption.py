@@ -3,7 +3,6 @@ import flet as ft
 import Cryptography
 import Steganography
 from GUI.Constants import TextStyle
-import os
 import base64
 
 class Encryption:
@@ -14,6 +13,8 @@ class Encryption:
     information = "Choose Image File & Key that will used to encrypt the data and generate Stego Image..."
     image_path = ""
     image_file_name = ""
+    payload_path = ""
+    payload_file_name = ""
     key_file_name = ft.TextField(
         label="Key File Name",
         hint_text="Enter Key File Name",
@@ -50,26 +51,41 @@ class Encryption:
                 self.response_message.update()
                 return
 
-            if len(self.key_data.value) == 0:
-                self.response_message.value = "Data is required..."
+            if len(self.key_data.value) == 0 and self.payload_path == "":
+                self.response_message.value = "Data or a payload file is required..."
                 self.response_message.color = ft.colors.RED_ACCENT
                 self.response_message.update()
                 return
 
-            key = f"C:\secret\key\{self.key_file_name.value}.txt.enc"
+            key = f"C:\secret\key\{self.key_file_name.value}"
 
             # check existence of key file
-            if not os.path.exists(key):
+            if not Cryptography.KeyGeneration.checkforfileexist(key):
                 self.response_message.value = "Key File is not found!, If not generate please generate it!"
                 self.response_message.color = ft.colors.RED_ACCENT
                 self.response_message.update()
                 return
 
+            destination_image_path = fr"C:\secret\stego\{self.image_file_name}"
+
+            # file payloads are streamed from disk, never through the text field;
+            # the file is used once, later encodes take the Data field again
+            if self.payload_path != "":
+                encrypter = Cryptography.Encrypter(key, mode=Cryptography.MODE_GCM)
+                if Steganography.FilePayload.encode(self.image_path, self.payload_path, destination_image_path, encrypter):
+                    self.response_message.value = f"Encrypted Image Saved with payload file {self.payload_file_name}..."
+                    self.response_message.color = ft.colors.GREEN_ACCENT
+                    clear_payload()
+                else:
+                    self.response_message.value = "Payload file does not fit in this image!"
+                    self.response_message.color = ft.colors.RED_ACCENT
+                self.response_message.update()
+                return
+
             encoded_string = self.key_data.value.encode()
             byte_array = bytearray(encoded_string)
 
-            encrypted_data = Cryptography.Encrypter(key).encrypt(byte_array)
-            destination_image_path = fr"C:\secret\stego\{self.image_file_name}"
+            encrypted_data = Cryptography.Encrypter(key, mode=Cryptography.MODE_GCM).encrypt(byte_array)
             dummy = "hello there this is plain text from string"
             data_to_pass = base64.b64encode(encrypted_data).decode()
 
@@ -80,7 +96,19 @@ class Encryption:
             # plaintext = Cryptography.Decrypter(key).decrypt(encrypted_data)
             # print(plaintext)
 
-            self.response_message.value = "Encrypted Image Saved..."
+            self.response_message.value = "Encrypted Image Saved with the text message..."
+            self.response_message.color = ft.colors.GREEN_ACCENT
+            self.response_message.update()
+
+        def clear_payload():
+            self.payload_path = ""
+            self.payload_file_name = ""
+            clear_payload_button.visible = False
+            clear_payload_button.update()
+
+        def handle_clear_payload(e):
+            clear_payload()
+            self.response_message.value = "Payload file cleared, the Data field will be encrypted"
             self.response_message.color = ft.colors.GREEN_ACCENT
             self.response_message.update()
 
@@ -91,8 +119,27 @@ class Encryption:
             self.image_file_name = e.files[0].name
             # File path is available here: Om
 
+        def on_payload_result(e: ft.FilePickerResultEvent):
+            if not e.files:
+                return
+            self.payload_path = e.files[0].path
+            self.payload_file_name = e.files[0].name
+            clear_payload_button.visible = True
+            clear_payload_button.update()
+            self.response_message.value = "Payload file: " + e.files[0].name + " (used instead of the Data field)"
+            self.response_message.color = ft.colors.GREEN_ACCENT
+            self.response_message.update()
+
         my_pick = ft.FilePicker(on_result=on_dialog_result)
+        payload_pick = ft.FilePicker(on_result=on_payload_result)
         self.page.overlay.append(my_pick)
+        self.page.overlay.append(payload_pick)
+        clear_payload_button = ft.ElevatedButton(
+            "Clear Payload",
+            icon=ft.icons.CLEAR,
+            visible=self.payload_path != "",
+            on_click=handle_clear_payload,
+        )
         return ft.Container(
             expand=True,
             content=ft.Column(
@@ -129,6 +176,12 @@ class Encryption:
                                     icon=ft.icons.UPLOAD_FILE,
                                     on_click=lambda _: my_pick.pick_files(),
                                 ),
+                                ft.ElevatedButton(
+                                    "Pick Payload File",
+                                    icon=ft.icons.ATTACH_FILE,
+                                    on_click=lambda _: payload_pick.pick_files(),
+                                ),
+                                clear_payload_button,
                             ],
                         ),
                     ),
@@ -0,0 +1,8 @@
+from .job import Job
+from .broker import InMemoryBroker
+from .amqp_broker import AMQPBroker
+from .worker import Worker, submit
+from .journal import JobJournal
+from .batch import BatchRunner
+from .pipeline import Pipeline, Stage, EncodePipeline
+from .hot_folder import HotFolder
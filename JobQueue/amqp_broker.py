@@ -0,0 +1,168 @@
+import queue as queue_module
+import threading
+import time
+
+from .broker import Delivery, to_body
+
+
+class AMQPBroker:
+    # RabbitMQ broker built on pika.
+    #
+    # pika's BlockingConnection is not thread safe, so each pooled entry is
+    # a (connection, channel) pair that one thread leases at a time.  Leases
+    # are reused LIFO, broken ones are dropped and rebuilt on the next
+    # lease, and operations that hit a connection error are retried with
+    # exponential backoff.  Publishes go through publisher confirms, and
+    # publish_many sends a whole batch over a single leased channel.
+    #
+    # connection_factory(parameters) lets tests substitute an in-memory
+    # stand-in for pika.BlockingConnection.
+    def __init__(self, host="localhost", pool_size=4, durable=True, retries=3,
+                 retry_delay=0.5, connection_factory=None, parameters=None):
+        self.durable = durable
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.declared = set()
+        self.pool = queue_module.LifoQueue()
+        self.slots = threading.BoundedSemaphore(pool_size)
+        self.local = threading.local()
+
+        if connection_factory is None:
+            import pika
+            connection_factory = pika.BlockingConnection
+            parameters = parameters or pika.ConnectionParameters(host)
+            self.properties = pika.BasicProperties(delivery_mode=2 if durable else 1)
+            self.connection_errors = (pika.exceptions.AMQPConnectionError, pika.exceptions.AMQPChannelError)
+        else:
+            self.properties = None
+            self.connection_errors = (ConnectionError,)
+        self.connection_factory = connection_factory
+        self.parameters = parameters
+
+    def open_lease(self):
+        connection = self.connection_factory(self.parameters)
+        channel = connection.channel()
+        channel.confirm_delivery()
+        return connection, channel
+
+    def lease(self):
+        self.slots.acquire()
+        try:
+            return self.pool.get_nowait()
+        except queue_module.Empty:
+            try:
+                return self.open_lease()
+            except BaseException:
+                self.slots.release()
+                raise
+
+    def release(self, lease, broken=False):
+        if broken:
+            self.discard(lease)
+        else:
+            self.pool.put(lease)
+        self.slots.release()
+
+    def discard(self, lease):
+        connection, channel = lease
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def run(self, operation):
+        # Run operation(channel) on a pooled channel, retrying on
+        # connection errors with a fresh lease each time
+        for attempt in range(self.retries + 1):
+            lease = self.lease()
+            try:
+                result = operation(lease[1])
+            except self.connection_errors:
+                self.release(lease, broken=True)
+                # queues must be redeclared on the new connection
+                self.declared.clear()
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.retry_delay * (2 ** attempt))
+            except BaseException:
+                self.release(lease)
+                raise
+            else:
+                self.release(lease)
+                return result
+
+    def ensure_queue(self, channel, queue):
+        if queue not in self.declared:
+            channel.queue_declare(queue=queue, durable=self.durable)
+            self.declared.add(queue)
+
+    def declare(self, queue):
+        self.run(lambda channel: self.ensure_queue(channel, queue))
+
+    def publish(self, queue, body):
+        self.publish_many(queue, [body])
+
+    def publish_many(self, queue, bodies):
+        bodies = [to_body(body) for body in bodies]
+
+        def send(channel):
+            self.ensure_queue(channel, queue)
+            for body in bodies:
+                channel.basic_publish(exchange="", routing_key=queue, body=body,
+                                      properties=self.properties)
+
+        self.run(send)
+
+    # Consuming is bound to the channel a message was delivered on, so each
+    # consumer thread keeps its own dedicated lease outside the pool.
+    def consumer_lease(self):
+        lease = getattr(self.local, "lease", None)
+        if lease is None:
+            lease = self.local.lease = self.open_lease()
+        return lease
+
+    def get(self, queue, timeout=None):
+        deadline = time.monotonic() + (timeout or 0)
+        while True:
+            try:
+                channel = self.consumer_lease()[1]
+                self.ensure_queue(channel, queue)
+                method, properties, body = channel.basic_get(queue=queue, auto_ack=False)
+            except self.connection_errors:
+                self.reset_consumer()
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(self.retry_delay)
+                continue
+            if method is not None:
+                return Delivery(queue, method.delivery_tag, body)
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(min(0.05, max(deadline - time.monotonic(), 0)))
+
+    def reset_consumer(self):
+        lease = getattr(self.local, "lease", None)
+        self.local.lease = None
+        self.declared.clear()
+        if lease is not None:
+            self.discard(lease)
+
+    def ack(self, delivery):
+        self.consumer_lease()[1].basic_ack(delivery_tag=delivery.tag)
+
+    def nack(self, delivery, requeue=True):
+        self.consumer_lease()[1].basic_nack(delivery_tag=delivery.tag, requeue=requeue)
+
+    def size(self, queue):
+        def count(channel):
+            return channel.queue_declare(queue=queue, durable=self.durable, passive=True).method.message_count
+
+        return self.run(count)
+
+    def close(self):
+        self.reset_consumer()
+        while True:
+            try:
+                self.discard(self.pool.get_nowait())
+            except queue_module.Empty:
+                break
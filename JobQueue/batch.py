@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from Monitoring import stego as metrics
+from Steganography import Decoding, image_cache
+
+from .journal import JobJournal
+from .worker import DEFAULT_HANDLERS
+
+
+def verify_encode(src, message, dest, **options):
+    # a stego image left behind by an interrupted run is kept only if the
+    # whole payload reads back from it
+    try:
+        image_cache.invalidate(dest)
+        return Decoding.extract(dest) == message
+    except (OSError, ValueError):
+        return False
+
+
+DEFAULT_VERIFIERS = {
+    "encode": verify_encode,
+}
+
+
+class BatchRunner:
+    # Runs a batch of Jobs against a JobJournal so that a crashed or
+    # interrupted run can simply be started again with the same jobs:
+    #
+    #   - done jobs are skipped, as long as their output file still has
+    #     the size and mtime recorded (a stat, never a read)
+    #   - jobs that were started but never finished had their output
+    #     checked by the kind's verifier; a good output is kept, a partial
+    #     one is removed and the job runs again
+    #   - failed jobs are retried until max_attempts
+    #
+    # An attempt is counted when it starts, so a job that takes the whole
+    # process down with it also runs out of attempts instead of being
+    # resumed forever.
+    #
+    # Jobs are identified by a hash of kind and params, not by job_id, so
+    # the same batch rebuilt after a restart maps onto the same records.
+    def __init__(self, journal, handlers=None, verifiers=None, max_attempts=3, workers=1):
+        self.journal = journal
+        self.handlers = dict(DEFAULT_HANDLERS if handlers is None else handlers)
+        self.verifiers = dict(DEFAULT_VERIFIERS if verifiers is None else verifiers)
+        self.max_attempts = max_attempts
+        self.workers = workers
+        self.counts_lock = threading.Lock()
+
+    def job_key(job):
+        body = json.dumps([job.kind, job.params], sort_keys=True, default=str)
+        return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+    def output_stat(job):
+        dest = job.params.get("dest")
+        if dest is None:
+            return {}
+        try:
+            stat = os.stat(dest)
+        except FileNotFoundError:
+            return {}
+        return {"output": dest, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def pending(self, job, key):
+        # Returns the attempts already spent if the job still has to run,
+        # or None if it can be skipped
+        record = self.journal.get(key)
+        if record is None:
+            return 0
+        attempts = record.get("attempts", 0)
+        if record["state"] == JobJournal.DONE:
+            if "output" not in record or BatchRunner.output_stat(job) == {
+                    name: record[name] for name in ("output", "size", "mtime_ns")}:
+                return None
+            # the output changed since, this is a fresh job
+            return 0
+        if record["state"] == JobJournal.STARTED:
+            verifier = self.verifiers.get(job.kind)
+            if verifier is not None and job.params.get("dest") and os.path.exists(job.params["dest"]):
+                if verifier(**job.params):
+                    self.journal.record(key, JobJournal.DONE, attempts, **BatchRunner.output_stat(job))
+                    return None
+                os.remove(job.params["dest"])
+            if attempts >= self.max_attempts:
+                self.journal.record(key, JobJournal.FAILED, attempts, error="interrupted on the last attempt")
+                metrics.JOBS.labels(job.kind, "failed").inc()
+                return None
+            return attempts
+        if attempts >= self.max_attempts:
+            return None
+        return attempts
+
+    def run_one(self, job):
+        key = BatchRunner.job_key(job)
+        attempts = self.pending(job, key)
+        if attempts is None:
+            state = self.journal.get(key)["state"]
+            return "skipped" if state == JobJournal.DONE else JobJournal.FAILED
+
+        while attempts < self.max_attempts:
+            attempts += 1
+            self.journal.record(key, JobJournal.STARTED, attempts)
+            try:
+                result = self.handlers[job.kind](**job.params)
+            except Exception:
+                self.journal.record(key, JobJournal.FAILED, attempts, error=traceback.format_exc(limit=3))
+                metrics.JOBS.labels(job.kind, "retried" if attempts < self.max_attempts else "failed").inc()
+                continue
+            if result is False:
+                # handlers that report failure by value (e.g. capacity)
+                self.journal.record(key, JobJournal.FAILED, attempts, error="handler returned False")
+                metrics.JOBS.labels(job.kind, "retried" if attempts < self.max_attempts else "failed").inc()
+                continue
+            self.journal.record(key, JobJournal.DONE, attempts, **BatchRunner.output_stat(job))
+            metrics.JOBS.labels(job.kind, "done").inc()
+            return JobJournal.DONE
+        return JobJournal.FAILED
+
+    def run(self, jobs):
+        # Returns {"done": n, "skipped": n, "failed": n}
+        counts = {JobJournal.DONE: 0, "skipped": 0, JobJournal.FAILED: 0}
+
+        def run_and_count(job):
+            outcome = self.run_one(job)
+            with self.counts_lock:
+                counts[outcome] += 1
+
+        try:
+            if self.workers <= 1:
+                for job in jobs:
+                    run_and_count(job)
+            else:
+                with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                    list(pool.map(run_and_count, jobs))
+        finally:
+            self.journal.sync()
+        return counts
@@ -0,0 +1,68 @@
+import itertools
+import threading
+from collections import deque
+
+
+def to_body(body):
+    if isinstance(body, str):
+        return body.encode("utf-8")
+    return bytes(body)
+
+
+class Delivery:
+    # A message handed to a consumer; it stays unacknowledged (and is
+    # redelivered on nack) until the consumer calls broker.ack(delivery).
+    def __init__(self, queue, tag, body):
+        self.queue = queue
+        self.tag = tag
+        self.body = body
+
+
+class InMemoryBroker:
+    # In-process broker with the same interface as AMQPBroker.  Used when
+    # workers run inside the application and as a stand-in for RabbitMQ.
+    def __init__(self):
+        self.queues = {}
+        self.unacked = {}
+        self.tags = itertools.count(1)
+        self.condition = threading.Condition()
+
+    def declare(self, queue):
+        with self.condition:
+            self.queues.setdefault(queue, deque())
+
+    def publish(self, queue, body):
+        self.publish_many(queue, [body])
+
+    def publish_many(self, queue, bodies):
+        with self.condition:
+            self.queues.setdefault(queue, deque()).extend(to_body(body) for body in bodies)
+            self.condition.notify_all()
+
+    def get(self, queue, timeout=None):
+        with self.condition:
+            pending = self.queues.setdefault(queue, deque())
+            if not pending and timeout:
+                self.condition.wait_for(lambda: pending, timeout)
+            if not pending:
+                return None
+            delivery = Delivery(queue, next(self.tags), pending.popleft())
+            self.unacked[delivery.tag] = delivery
+            return delivery
+
+    def ack(self, delivery):
+        with self.condition:
+            self.unacked.pop(delivery.tag, None)
+
+    def nack(self, delivery, requeue=True):
+        with self.condition:
+            if self.unacked.pop(delivery.tag, None) is not None and requeue:
+                self.queues[delivery.queue].appendleft(delivery.body)
+                self.condition.notify_all()
+
+    def size(self, queue):
+        with self.condition:
+            return len(self.queues.get(queue, ()))
+
+    def close(self):
+        pass
@@ -0,0 +1,223 @@
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+
+from Cryptography import Encrypter, MODE_GCM
+from Monitoring import stego as metrics
+
+from .pipeline import EncodePipeline
+
+
+class HotFolder:
+    # Watches an inbox directory that upstream systems drop work into and
+    # encodes it without anyone going through the GUI.  A job is a JSON
+    # manifest next to its cover:
+    #
+    #   {"cover": "scan_001.png", "message": "...", "output": "scan_001.png"}
+    #
+    # with "payload": "<file in the inbox>" instead of "message" for
+    # binary payloads (framed modes only), and "output" defaulting to the
+    # cover name.
+    #
+    # The inbox is polled; a file counts once its size and mtime have not
+    # changed for `settle` seconds, and names starting with "." or ending
+    # in PARTIAL_SUFFIXES are ignored, so half-written files are never
+    # picked up.  Ready manifests are collected into micro-batches of up to
+    # batch_size (or whatever has waited batch_wait seconds) and run
+    # through the EncodePipeline's worker pool (by default the sequential
+    # framed mode with AES-GCM, which carries binary payloads and whose
+    # text outputs the Decryption screen reads).  Outputs are written to
+    # done_dir/.work and os.replace'd into done_dir, so they appear there
+    # whole, and never over an existing file: a job whose output is already
+    # in done_dir, or taken by an earlier job of its batch, fails.  Inputs
+    # of finished jobs are moved to archive_dir, or deleted without one;
+    # failed jobs are moved to failed_dir with a .error note.
+    MANIFEST_SUFFIX = ".json"
+    PARTIAL_SUFFIXES = (".part", ".partial", ".tmp", ".crdownload", ".filepart")
+
+    def __init__(self, inbox, done_dir, pipeline=None, failed_dir=None, archive_dir=None,
+                 settle=2.0, poll_interval=1.0, batch_size=16, batch_wait=1.0):
+        self.inbox = inbox
+        self.done_dir = done_dir
+        self.work_dir = os.path.join(done_dir, ".work")
+        self.failed_dir = failed_dir or os.path.join(inbox, "failed")
+        self.archive_dir = archive_dir
+        self.pipeline = pipeline or EncodePipeline(encrypter=Encrypter("", mode=MODE_GCM), mode="sequential")
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        # name -> ((size, mtime_ns), unchanged since)
+        self.seen = {}
+        # manifest name -> (manifest, ready since), in arrival order
+        self.pending = {}
+        self.stop_event = threading.Event()
+        for folder in (self.done_dir, self.work_dir, self.failed_dir, self.archive_dir):
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+        # outputs of a run that died before moving them
+        for name in os.listdir(self.work_dir):
+            os.remove(os.path.join(self.work_dir, name))
+
+    def scan(self, now):
+        # Names of the inbox files that have settled.  Settling is timed
+        # from the first poll that saw a file, not its mtime, since clocks
+        # on shared directories do not always agree.
+        settled = set()
+        current = {}
+        with os.scandir(self.inbox) as entries:
+            for entry in entries:
+                if (entry.name.startswith(".") or entry.name.endswith(self.PARTIAL_SUFFIXES)
+                        or not entry.is_file()):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                signature = (stat.st_size, stat.st_mtime_ns)
+                previous = self.seen.get(entry.name)
+                since = previous[1] if previous is not None and previous[0] == signature else now
+                current[entry.name] = (signature, since)
+                if now - since >= self.settle:
+                    settled.add(entry.name)
+        self.seen = current
+        return settled
+
+    def inputs(manifest):
+        names = [manifest["cover"]]
+        if "payload" in manifest:
+            names.append(manifest["payload"])
+        if not all(isinstance(name, str) and name and os.path.basename(name) == name for name in names):
+            raise ValueError("cover and payload must be file names in the inbox")
+        return names
+
+    def collect(self, settled, now):
+        # Queues manifests whose cover (and payload) have settled as well
+        self.pending = {name: value for name, value in self.pending.items() if name in settled}
+        for name in sorted(settled):
+            if not name.endswith(self.MANIFEST_SUFFIX) or name in self.pending:
+                continue
+            try:
+                with open(os.path.join(self.inbox, name), encoding="utf-8") as fo:
+                    manifest = json.load(fo)
+                inputs = HotFolder.inputs(manifest)
+            except (OSError, ValueError, KeyError, TypeError):
+                # a settled manifest that does not parse will not get better
+                self.fail(name, [], traceback.format_exc(limit=1))
+                continue
+            if all(input_name in settled for input_name in inputs):
+                self.pending[name] = (manifest, now)
+        metrics.PIPELINE_QUEUE_DEPTH.labels("inbox").set(len(self.pending))
+
+    def poll(self, now=None):
+        # One scan of the inbox; runs every batch that is due and returns
+        # the number of jobs finished
+        now = time.monotonic() if now is None else now
+        self.collect(self.scan(now), now)
+        finished = 0
+        while self.pending and (len(self.pending) >= self.batch_size
+                                or now - min(since for _, since in self.pending.values()) >= self.batch_wait):
+            names = list(self.pending)[:self.batch_size]
+            batch = [(name, self.pending.pop(name)[0]) for name in names]
+            finished += self.process(batch)
+        metrics.PIPELINE_QUEUE_DEPTH.labels("inbox").set(len(self.pending))
+        return finished
+
+    def process(self, batch):
+        items = []
+        jobs = []
+        outputs = set()
+        # failed after the batch ran, so an input shared with a job of the
+        # batch stays in the inbox until that job is done with it
+        rejected = []
+        for name, manifest in batch:
+            try:
+                if "payload" in manifest:
+                    with open(os.path.join(self.inbox, manifest["payload"]), "rb") as fo:
+                        message = fo.read()
+                else:
+                    message = manifest["message"]
+                output = os.path.basename(manifest.get("output") or manifest["cover"])
+            except (OSError, KeyError, TypeError):
+                rejected.append((name, HotFolder.inputs(manifest), traceback.format_exc(limit=1)))
+                continue
+            if output in outputs or os.path.exists(os.path.join(self.done_dir, output)):
+                rejected.append((name, HotFolder.inputs(manifest), "output already exists: " + output))
+                continue
+            outputs.add(output)
+            temp = os.path.join(self.work_dir, uuid.uuid4().hex + "-" + output)
+            items.append((os.path.join(self.inbox, manifest["cover"]), message, temp))
+            jobs.append((name, manifest, temp, output))
+
+        results = self.pipeline.run(items)
+        finished = 0
+        retired = set()
+        for (name, manifest, temp, output), result in zip(jobs, results):
+            inputs = HotFolder.inputs(manifest)
+            if result is True:
+                dest = os.path.join(self.done_dir, output)
+                try:
+                    # something else may have written it during the batch
+                    if os.path.exists(dest):
+                        raise FileExistsError("output already exists: " + output)
+                    os.replace(temp, dest)
+                except OSError:
+                    result = traceback.format_exc(limit=1)
+            if result is True:
+                self.retire(name)
+                retired.update(inputs)
+                metrics.JOBS.labels("hot_folder", "done").inc()
+                finished += 1
+                continue
+            if os.path.exists(temp):
+                os.remove(temp)
+            error = ("message does not fit the cover" if result is False
+                     else result if isinstance(result, str) else repr(result))
+            self.fail(name, inputs, error)
+        for input_name in retired - self.needed():
+            self.retire(input_name)
+        for name, inputs, error in rejected:
+            self.fail(name, inputs, error)
+        return finished
+
+    def needed(self):
+        # inputs of queued manifests; a cover shared by several manifests
+        # stays in the inbox until the last of them is done
+        return {input_name for manifest, _ in self.pending.values() for input_name in HotFolder.inputs(manifest)}
+
+    def retire(self, name):
+        path = os.path.join(self.inbox, name)
+        if not os.path.exists(path):
+            return
+        if self.archive_dir:
+            os.replace(path, os.path.join(self.archive_dir, name))
+        else:
+            os.remove(path)
+
+    def fail(self, name, inputs, error):
+        needed = self.needed()
+        for moved in [name] + [input_name for input_name in inputs if input_name not in needed]:
+            path = os.path.join(self.inbox, moved)
+            if os.path.exists(path):
+                os.replace(path, os.path.join(self.failed_dir, moved))
+        with open(os.path.join(self.failed_dir, name + ".error"), "w", encoding="utf-8") as fo:
+            fo.write(error)
+        metrics.JOBS.labels("hot_folder", "failed").inc()
+
+    def run(self):
+        # A poll that fails (a share that is briefly unreachable, a full
+        # disk) is reported and retried on the next one; jobs it dropped
+        # are still in the inbox and get collected again
+        while not self.stop_event.is_set():
+            try:
+                self.poll()
+            except Exception:
+                traceback.print_exc()
+                metrics.OPERATIONS.labels("hot_folder_poll", "error").inc()
+            self.stop_event.wait(self.poll_interval)
+
+    def stop(self):
+        self.stop_event.set()
@@ -0,0 +1,29 @@
+import json
+import uuid
+
+
+class Job:
+    # A unit of work for the stego worker fleet.  kind is one of the
+    # handler names registered on the Worker ("encode", "decode",
+    # "compare"), params are passed to the handler as keyword arguments.
+    def __init__(self, kind, params=None, job_id=None, attempts=0):
+        self.kind = kind
+        self.params = params or {}
+        self.job_id = job_id or uuid.uuid4().hex
+        self.attempts = attempts
+
+    def to_bytes(self):
+        return json.dumps({
+            "id": self.job_id,
+            "kind": self.kind,
+            "params": self.params,
+            "attempts": self.attempts,
+        }).encode("utf-8")
+
+    @staticmethod
+    def from_bytes(body):
+        data = json.loads(body)
+        return Job(data["kind"], data.get("params"), data.get("id"), data.get("attempts", 0))
+
+    def __repr__(self):
+        return "Job(%s, %s, attempts=%d)" % (self.kind, self.job_id, self.attempts)
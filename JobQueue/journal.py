@@ -0,0 +1,102 @@
+import json
+import os
+import threading
+import time
+
+
+class JobJournal:
+    # Append-only record of job state transitions, one JSON line each:
+    #
+    #   {"id": ..., "state": "started" | "done" | "failed", "attempts": n, ...}
+    #
+    # Writes go straight to the file but are fsynced in batches (every
+    # sync_every records or sync_interval seconds), so a crash can lose at
+    # most the last batch; a lost "done" only means that job runs again.
+    # Loading replays the lines into the latest state per job and ignores
+    # a torn final line.  Once the file holds many more lines than jobs it
+    # is compacted to one line per job, so reopening costs O(jobs).
+    STARTED = "started"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, path, sync_every=64, sync_interval=1.0):
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.lock = threading.Lock()
+        self.states = {}
+        lines = self.load()
+        if lines > 2 * len(self.states) + self.sync_every:
+            self.compact()
+        self.file = open(path, "a", encoding="utf-8")
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def load(self):
+        lines = 0
+        end = 0
+        try:
+            with open(self.path, "rb") as fo:
+                for line in fo:
+                    if not line.endswith(b"\n"):
+                        # torn write from a crash, only ever the last line
+                        break
+                    end += len(line)
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.states[record["id"]] = record
+                    lines += 1
+            if end != os.path.getsize(self.path):
+                # drop the torn tail so new records start on a fresh line
+                with open(self.path, "r+b") as fo:
+                    fo.truncate(end)
+        except FileNotFoundError:
+            pass
+        return lines
+
+    def compact(self):
+        temp = self.path + ".tmp"
+        with open(temp, "w", encoding="utf-8") as fo:
+            for record in self.states.values():
+                fo.write(json.dumps(record) + "\n")
+            fo.flush()
+            os.fsync(fo.fileno())
+        os.replace(temp, self.path)
+
+    def get(self, job_id):
+        with self.lock:
+            return self.states.get(job_id)
+
+    def record(self, job_id, state, attempts=0, **details):
+        entry = dict(details, id=job_id, state=state, attempts=attempts)
+        with self.lock:
+            self.states[job_id] = entry
+            self.file.write(json.dumps(entry) + "\n")
+            self.unsynced += 1
+            if (self.unsynced >= self.sync_every
+                    or time.monotonic() - self.last_sync >= self.sync_interval):
+                self.sync_locked()
+        return entry
+
+    def sync(self):
+        with self.lock:
+            self.sync_locked()
+
+    def sync_locked(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            self.sync_locked()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
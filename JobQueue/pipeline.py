@@ -0,0 +1,165 @@
+import base64
+import queue
+import threading
+
+from Monitoring import stego as metrics
+from Steganography import CarrierFormat, Encoding, image_cache
+
+
+class Stage:
+    # One pipeline step: function(task) -> task, run by `workers` threads
+    # that take tasks from a queue holding at most queue_size items.
+    def __init__(self, name, function, workers=1, queue_size=4):
+        if workers < 1 or queue_size < 1:
+            raise ValueError("workers and queue_size must be at least 1")
+        self.name = name
+        self.function = function
+        self.workers = workers
+        self.queue_size = queue_size
+
+
+class Failed:
+    # Carries an exception past the remaining stages
+    def __init__(self, error):
+        self.error = error
+
+
+class Pipeline:
+    # Runs items through a chain of Stages connected by bounded queues, so
+    # the stages work on different items at the same time and a slow stage
+    # holds the ones before it back instead of letting work pile up in
+    # memory.  Queue depths and busy workers are exported per stage
+    # (stego_pipeline_queue_depth / stego_pipeline_busy_workers): the
+    # bottleneck is the stage whose input queue stays full.  Items whose
+    # stage raised are counted as OPERATIONS{operation, "error"} when the
+    # subclass names an operation.
+    DONE = object()
+    operation = None
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+
+    def run(self, items):
+        # Returns one result per item, in input order; an item whose stage
+        # raised gets the exception instead
+        queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        results = {}
+        results_lock = threading.Lock()
+        remaining = [stage.workers for stage in self.stages]
+        remaining_lock = threading.Lock()
+
+        def put(index, entry):
+            queues[index].put(entry)
+            metrics.PIPELINE_QUEUE_DEPTH.labels(self.stages[index].name).set(queues[index].qsize())
+
+        def work(index):
+            stage = self.stages[index]
+            busy = metrics.PIPELINE_BUSY_WORKERS.labels(stage.name)
+            while True:
+                entry = queues[index].get()
+                metrics.PIPELINE_QUEUE_DEPTH.labels(stage.name).set(queues[index].qsize())
+                if entry is self.DONE:
+                    break
+                position, task = entry
+                if not isinstance(task, Failed):
+                    busy.inc()
+                    try:
+                        with metrics.STAGE_SECONDS.time(stage.name):
+                            task = stage.function(task)
+                    except Exception as error:
+                        task = Failed(error)
+                        if self.operation is not None:
+                            metrics.OPERATIONS.labels(self.operation, "error").inc()
+                    finally:
+                        busy.dec()
+                if index + 1 < len(self.stages):
+                    put(index + 1, (position, task))
+                else:
+                    with results_lock:
+                        results[position] = task.error if isinstance(task, Failed) else task
+
+            # the last worker out closes the next stage
+            with remaining_lock:
+                remaining[index] -= 1
+                last = remaining[index] == 0
+            if last and index + 1 < len(self.stages):
+                for _ in range(self.stages[index + 1].workers):
+                    put(index + 1, self.DONE)
+
+        threads = [threading.Thread(target=work, args=(index,), daemon=True)
+                   for index, stage in enumerate(self.stages) for _ in range(stage.workers)]
+        for thread in threads:
+            thread.start()
+        count = 0
+        try:
+            for count, item in enumerate(items, 1):
+                put(0, (count - 1, item))
+        finally:
+            for _ in range(self.stages[0].workers):
+                put(0, self.DONE)
+            for thread in threads:
+                thread.join()
+        return [results[position] for position in range(count)]
+
+
+class EncodePipeline(Pipeline):
+    # load -> encrypt -> embed -> save for batches of (src, message, dest).
+    # PNG decode and encode dominate for most covers, so load and save get
+    # two workers each by default; all four stages release the GIL for
+    # most of their work (zlib, AES, NumPy).  Messages are encrypted when
+    # an Encrypter is given: text messages, and anything in the legacy
+    # format, become base64 text as the Encryption screen writes them (so
+    # the Decryption screen reads them back); binary payloads stay raw
+    # bytes in the framed modes.  Each result is True, False (did not
+    # fit) or the exception raised.
+    operation = "encode"
+    def __init__(self, encrypter=None, mode=None, matrix_k=3, load_workers=2, encrypt_workers=1,
+                 embed_workers=1, save_workers=2, queue_size=4, depth=1):
+        self.encrypter = encrypter
+        self.mode = mode
+        self.matrix_k = matrix_k
+        self.depth = depth
+        super().__init__([
+            Stage("load", self.load, load_workers, queue_size),
+            Stage("encrypt", self.encrypt, encrypt_workers, queue_size),
+            Stage("embed", self.embed, embed_workers, queue_size),
+            Stage("save", self.save, save_workers, queue_size),
+        ])
+
+    def load(self, task):
+        # Covers are read straight from disk rather than through image_cache:
+        # a batch would push the interactive entries out of the cache and
+        # keep arrays of inputs that are usually removed right after
+        src, message, dest = task
+        array, image_mode = CarrierFormat.load(src)
+        if not array.flags.writeable:
+            array = array.copy()
+        return {"message": message, "dest": dest, "array": array, "image_mode": image_mode}
+
+    def encrypt(self, task):
+        if self.encrypter is not None:
+            message = task["message"]
+            text = isinstance(message, str)
+            encrypted = self.encrypter.encrypt(message.encode("utf-8") if text else message)
+            task["message"] = base64.b64encode(encrypted).decode() if text or self.mode is None else encrypted
+        return task
+
+    def embed(self, task):
+        channels = CarrierFormat.channels(task["image_mode"])
+        touched = Encoding.embed_pixels(task["array"], task["message"], self.mode, channels, self.matrix_k,
+                                        depth=self.depth)
+        if touched is None:
+            metrics.CAPACITY_FAILURES.inc()
+            metrics.OPERATIONS.labels("encode", "error").inc()
+        task["touched"] = touched
+        return task
+
+    def save(self, task):
+        if task["touched"] is None:
+            return False
+        CarrierFormat.save(task["array"], task["image_mode"], task["dest"])
+        image_cache.invalidate(task["dest"])
+        metrics.OPERATIONS.labels("encode", "ok").inc()
+        metrics.BYTES_EMBEDDED.inc(len(task["message"]))
+        metrics.PIXELS_TOUCHED.inc(task["touched"])
+        return True
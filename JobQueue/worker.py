@@ -0,0 +1,116 @@
+import functools
+import json
+import threading
+import traceback
+
+from Monitoring import stego as metrics
+from Steganography import Decoding, Encoding, Steganalysis, TiledMetrics
+
+from .job import Job
+
+DEFAULT_QUEUE = "stego_jobs"
+
+
+def encode_handler(src, message, dest, store=None, **options):
+    return Encoding.encode(src, message, dest, store=store, **options)
+
+
+def decode_handler(src):
+    return Decoding.decode(src)
+
+
+def compare_handler(original, stego):
+    result = TiledMetrics().compare_files(original, stego)
+    result["detectability"] = Steganalysis.analyze_file(stego)["score"]
+    return result
+
+
+def analyze_handler(src):
+    return Steganalysis.analyze_file(src)
+
+
+DEFAULT_HANDLERS = {
+    "encode": encode_handler,
+    "decode": decode_handler,
+    "compare": compare_handler,
+    "analyze": analyze_handler,
+}
+
+
+def submit(broker, jobs, queue=DEFAULT_QUEUE):
+    # Publish jobs in one batch and return their ids
+    broker.publish_many(queue, [job.to_bytes() for job in jobs])
+    return [job.job_id for job in jobs]
+
+
+class Worker:
+    # Pulls jobs from <queue>, runs the matching handler and publishes the
+    # outcome to <queue>.results.  A failing job is republished with its
+    # attempt count bumped until max_attempts, then moved to <queue>.failed.
+    # A handler that reports failure by returning False (e.g. a payload that
+    # does not fit the cover) would fail the same way again, so that job
+    # goes to <queue>.failed straight away.
+    # The delivery is only acknowledged once the outcome is published, so a
+    # worker that dies mid-job leaves the job for another worker.  With a
+    # result_store, re-submitted encodes are served from earlier outputs.
+    def __init__(self, broker, queue=DEFAULT_QUEUE, handlers=None, max_attempts=3, result_store=None):
+        self.broker = broker
+        self.queue = queue
+        self.results_queue = queue + ".results"
+        self.failed_queue = queue + ".failed"
+        self.handlers = dict(DEFAULT_HANDLERS if handlers is None else handlers)
+        if result_store is not None and self.handlers.get("encode") is encode_handler:
+            self.handlers["encode"] = functools.partial(encode_handler, store=result_store)
+        self.max_attempts = max_attempts
+        self.stop_event = threading.Event()
+
+    def result_body(self, job, status, value):
+        return json.dumps({
+            "id": job.job_id,
+            "kind": job.kind,
+            "status": status,
+            "attempts": job.attempts,
+            "result": value,
+        }, default=str)
+
+    def process_one(self, timeout=1.0):
+        delivery = self.broker.get(self.queue, timeout=timeout)
+        if delivery is None:
+            return False
+
+        try:
+            job = Job.from_bytes(delivery.body)
+        except (ValueError, KeyError):
+            # unparseable messages can never succeed, do not retry them
+            self.broker.publish(self.failed_queue, delivery.body)
+            self.broker.ack(delivery)
+            return True
+
+        try:
+            handler = self.handlers[job.kind]
+            value = handler(**job.params)
+        except Exception:
+            job.attempts += 1
+            if job.attempts < self.max_attempts:
+                self.broker.publish(self.queue, job.to_bytes())
+                metrics.JOBS.labels(job.kind, "retried").inc()
+            else:
+                self.broker.publish(self.failed_queue, self.result_body(job, "failed", traceback.format_exc()))
+                metrics.JOBS.labels(job.kind, "failed").inc()
+        else:
+            if value is False:
+                job.attempts += 1
+                self.broker.publish(self.failed_queue, self.result_body(job, "failed", "handler returned False"))
+                metrics.JOBS.labels(job.kind, "failed").inc()
+            else:
+                self.broker.publish(self.results_queue, self.result_body(job, "done", value))
+                metrics.JOBS.labels(job.kind, "done").inc()
+        self.broker.ack(delivery)
+        return True
+
+    def run(self, timeout=1.0):
+        while not self.stop_event.is_set():
+            self.process_one(timeout)
+
+    def stop(self):
+        self.stop_event.set()
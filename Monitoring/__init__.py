@@ -0,0 +1,2 @@
+from .registry import Counter, Gauge, Histogram, Registry, registry
+from .exporter import MetricsServer, dump
@@ -0,0 +1,54 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .registry import registry as default_registry
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class MetricsServer:
+    # Serves the registry at http://host:port/metrics from a daemon thread.
+    # Binds to localhost by default; scrape it with Prometheus or curl.
+    def __init__(self, port=9464, host="127.0.0.1", registry=default_registry):
+        self.registry = registry
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = exporter.registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def dump(path, registry=default_registry):
+    # Atomically write the current values, e.g. for node_exporter's
+    # textfile collector or for attaching to a batch report
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fo:
+        fo.write(registry.render())
+    os.replace(tmp_path, path)
@@ -0,0 +1,40 @@
+from contextlib import contextmanager
+
+from .registry import registry
+
+# Metrics recorded by the Steganography, Cryptography and JobQueue packages.
+OPERATIONS = registry.counter(
+    "stego_operations_total", "Completed operations by outcome", ("operation", "status"))
+STAGE_SECONDS = registry.histogram(
+    "stego_stage_seconds", "Wall time spent per pipeline stage", ("stage",))
+BYTES_EMBEDDED = registry.counter(
+    "stego_bytes_embedded_total", "Payload bytes embedded into cover images")
+BYTES_EXTRACTED = registry.counter(
+    "stego_bytes_extracted_total", "Payload bytes extracted from stego images")
+PIXELS_TOUCHED = registry.counter(
+    "stego_pixels_touched_total", "Cover pixels whose LSBs were rewritten")
+CAPACITY_FAILURES = registry.counter(
+    "stego_capacity_failures_total", "Encodes rejected because the payload did not fit")
+CRYPTO_BYTES = registry.counter(
+    "stego_crypto_bytes_total", "Bytes passed through AES", ("direction",))
+CACHE_REQUESTS = registry.counter(
+    "stego_cache_requests_total", "Image cache lookups", ("kind", "result"))
+CACHE_EVICTIONS = registry.counter(
+    "stego_cache_evictions_total", "Image cache entries evicted to stay in budget", ("kind",))
+JOBS = registry.counter(
+    "stego_jobs_total", "Queued jobs processed by workers", ("kind", "status"))
+PIPELINE_QUEUE_DEPTH = registry.gauge(
+    "stego_pipeline_queue_depth", "Items waiting in front of each pipeline stage", ("stage",))
+PIPELINE_BUSY_WORKERS = registry.gauge(
+    "stego_pipeline_busy_workers", "Pipeline stage workers currently processing an item", ("stage",))
+
+
+@contextmanager
+def errors(operation):
+    # Counts an exception escaping the block as OPERATIONS{status="error"}
+    # and re-raises it; outcomes returned by value are counted by the caller
+    try:
+        yield
+    except Exception:
+        OPERATIONS.labels(operation, "error").inc()
+        raise
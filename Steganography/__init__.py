@@ -1,3 +1,18 @@
 from .encoding import Encoding
 from .decoding import Decoding
 from .difference import DifferenceStego
+from .cache import ImageCache, image_cache
+from .tiled_metrics import TiledMetrics
+from .sampled_metrics import SampledMetrics
+from .header import StegoHeader
+from .bit_engine import BitEngine
+from .adaptive import AdaptiveSelector
+from .matrix_embedding import MatrixEmbedding
+from .raw_carrier import RawCarrier
+from .carrier_format import CarrierFormat
+from .partial_read import PartialReader
+from .result_store import ResultStore
+from .file_payload import FilePayload
+from .memory import MemoryStego
+from .catalog import CoverCatalog
+from .steganalysis import Steganalysis
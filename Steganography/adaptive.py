@@ -0,0 +1,54 @@
+import numpy as np
+
+
+class AdaptiveSelector:
+    # Edge-aware pixel selection for the "adaptive" embedding mode.
+    #
+    # The cost of changing a pixel is taken to be inversely related to its
+    # local texture, measured as the sum of absolute differences to the
+    # four neighbours on the image with every LSB cleared.  Because the
+    # measure ignores LSBs, the decoder recomputes exactly the same map
+    # from the stego image.  The `count` most textured pixels are chosen
+    # with a histogram threshold (ties broken in raster order) instead of a
+    # sort, which keeps selection O(pixels) and fully deterministic.
+    def texture_map(image, channels=3):
+        # image is (height, width, bands) or (height, width), 8 or 16 bits
+        kind = np.int16 if image.dtype.itemsize == 1 else np.int32
+        if image.ndim == 2:
+            base = (image >> 1).astype(kind)
+        else:
+            base = (image[:, :, 0] >> 1).astype(kind)
+            for band in range(1, min(channels, image.shape[2])):
+                base += image[:, :, band] >> 1
+
+        texture = np.zeros(base.shape, dtype=kind)
+        horizontal = np.abs(np.diff(base, axis=1))
+        vertical = np.abs(np.diff(base, axis=0))
+        texture[:, :-1] += horizontal
+        texture[:, 1:] += horizontal
+        texture[:-1, :] += vertical
+        texture[1:, :] += vertical
+        return texture
+
+    def select(image, count, skip=0, channels=3):
+        # Flat pixel indices (raster order) of the `count` most textured
+        # pixels, never choosing any of the first `skip` pixels, which hold
+        # the header.
+        texture = AdaptiveSelector.texture_map(image, channels).reshape(-1)
+        available = texture.size - skip
+        if count > available:
+            raise ValueError("Not enough pixels for adaptive embedding")
+        if count == 0:
+            return np.empty(0, dtype=np.intp)
+
+        candidates = texture[skip:]
+        histogram = np.bincount(candidates)
+        # number of candidates with texture >= t, for every t
+        at_least = np.cumsum(histogram[::-1])[::-1]
+        threshold = int(np.flatnonzero(at_least >= count)[-1])
+        above = at_least[threshold + 1] if threshold + 1 < len(at_least) else 0
+
+        chosen = candidates > threshold
+        ties = np.flatnonzero(candidates == threshold)[:count - above]
+        chosen[ties] = True
+        return np.flatnonzero(chosen) + skip
@@ -0,0 +1,122 @@
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class BitEngine:
+    # Vectorised LSB embedding and extraction.
+    #
+    # All functions work on a (pixels, bands) uint8 or uint16 view of the
+    # image and use the first `channels` bands as carriers, in pixel order:
+    # bit i lives in band i % channels of pixel i // channels, exactly like
+    # the original R, G, B loop.  Only the pixels that carry bits are
+    # copied.  With depth > 1 every carrier sample holds `depth` low bits,
+    # most significant first; `start` always counts carrier samples.
+    #
+    # embed_bytes / extract_bytes work on whole payload bytes and split
+    # large payloads into chunks whose boundaries fall on both a payload
+    # byte and a pixel (every 24 bits for RGB), so each chunk unpacks its
+    # own bytes and touches its own pixels.  The chunks run on a thread
+    # pool; the NumPy operations involved release the GIL.
+    PARALLEL_MIN_BITS = 1 << 22
+    def to_bits(data):
+        return np.unpackbits(np.frombuffer(bytes(data), dtype=np.uint8))
+
+    def from_bits(bits):
+        return np.packbits(bits).tobytes()
+
+    def pixel_span(start, count, channels=3):
+        return start // channels, -(-(start + count) // channels)
+
+    def low_mask(dtype, depth=1):
+        # keeps everything but the low `depth` bits of a sample
+        return ~dtype.type((1 << depth) - 1)
+
+    def pack_samples(bits, depth):
+        # depth bits per sample value, most significant first
+        samples = -(-len(bits) // depth)
+        padded = np.zeros(samples * depth, dtype=np.uint8)
+        padded[:len(bits)] = bits
+        columns = padded.reshape(samples, depth)
+        value = np.zeros(samples, dtype=np.uint8)
+        for column in range(depth):
+            value <<= 1
+            value |= columns[:, column]
+        return value
+
+    def unpack_samples(values, depth):
+        low = (values & ((1 << depth) - 1)).astype(np.uint8)
+        return np.unpackbits(low[:, None], axis=1)[:, 8 - depth:].reshape(-1)
+
+    def embed_sequential(pixels, bits, start=0, channels=3, depth=1):
+        count = -(-len(bits) // depth)
+        first, last = BitEngine.pixel_span(start, count, channels)
+        carriers = pixels[first:last, :channels].reshape(-1)
+        offset = start - first * channels
+        target = carriers[offset:offset + count]
+        values = bits if depth == 1 else BitEngine.pack_samples(bits, depth)
+        carriers[offset:offset + count] = (target & BitEngine.low_mask(target.dtype, depth)) | values
+        pixels[first:last, :channels] = carriers.reshape(-1, channels)
+
+    def extract_sequential(pixels, start, count, channels=3, depth=1):
+        samples = -(-count // depth)
+        first, last = BitEngine.pixel_span(start, samples, channels)
+        offset = start - first * channels
+        values = pixels[first:last, :channels].reshape(-1)[offset:offset + samples]
+        if depth == 1:
+            return (values & 1).astype(np.uint8)
+        return BitEngine.unpack_samples(values, depth)[:count]
+
+    def embed_at(pixels, indices, bits, channels=3):
+        # bits are spread over the listed pixels in order; a short last
+        # pixel keeps its remaining LSBs
+        carriers = pixels[indices, :channels].reshape(-1)
+        target = carriers[:len(bits)]
+        carriers[:len(bits)] = (target & BitEngine.low_mask(target.dtype)) | bits
+        pixels[indices, :channels] = carriers.reshape(-1, channels)
+
+    def extract_at(pixels, indices, count, channels=3):
+        return (pixels[indices, :channels].reshape(-1)[:count] & 1).astype(np.uint8)
+
+    def chunk_bounds(start, count, channels=3, parts=None, depth=1):
+        # Bit offsets 0 = b0 < b1 < ... < bn = count; inner bounds are
+        # multiples of 8 and of depth with start + b / depth a multiple of
+        # channels
+        parts = parts or os.cpu_count() or 1
+        if parts < 2 or count < BitEngine.PARALLEL_MIN_BITS:
+            return [0, count]
+        step = 8 * depth // math.gcd(8, depth)
+        unit = step * channels // math.gcd(step // depth, channels)
+        first = next((offset for offset in range(0, unit, step)
+                      if (start + offset // depth) % channels == 0), None)
+        if first is None:
+            return [0, count]
+        size = -(-(count - first) // parts // unit) * unit or unit
+        return [0] + list(range(first + size, count, size)) + [count]
+
+    def run_chunks(function, bounds):
+        if len(bounds) == 2:
+            return [function(0, bounds[1])]
+        with ThreadPoolExecutor(max_workers=len(bounds) - 1) as pool:
+            return list(pool.map(function, bounds[:-1], bounds[1:]))
+
+    def embed_bytes(pixels, data, start=0, channels=3, parts=None, depth=1):
+        data = np.frombuffer(bytes(data), dtype=np.uint8)
+        bounds = BitEngine.chunk_bounds(start, len(data) * 8, channels, parts, depth)
+
+        def embed_chunk(low, high):
+            bits = np.unpackbits(data[low // 8:high // 8])
+            BitEngine.embed_sequential(pixels, bits, start + low // depth, channels, depth)
+
+        BitEngine.run_chunks(embed_chunk, bounds)
+
+    def extract_bytes(pixels, start, length, channels=3, parts=None, depth=1):
+        bounds = BitEngine.chunk_bounds(start, length * 8, channels, parts, depth)
+
+        def extract_chunk(low, high):
+            bits = BitEngine.extract_sequential(pixels, start + low // depth, high - low, channels, depth)
+            return np.packbits(bits).tobytes()
+
+        return b"".join(BitEngine.run_chunks(extract_chunk, bounds))
@@ -0,0 +1,152 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from Monitoring import stego as metrics
+from .carrier_format import CarrierFormat
+
+
+class ImageCache:
+    # In-process LRU cache shared by the screens and the Steganography API.
+    # Entries are keyed by (kind, path, mtime, size) so an image that is
+    # rewritten on disk is never served stale.  Decoded pixel arrays and
+    # extracted payloads are budgeted separately so a few large covers can
+    # not push every payload out of the cache.
+    PIXELS = "pixels"
+    PAYLOAD = "payload"
+
+    def __init__(self, max_array_bytes=256 * 1024 * 1024, max_payload_bytes=32 * 1024 * 1024):
+        self.max_bytes = {
+            self.PIXELS: max_array_bytes,
+            self.PAYLOAD: max_payload_bytes,
+        }
+        self.used_bytes = {self.PIXELS: 0, self.PAYLOAD: 0}
+        self.entries = {self.PIXELS: OrderedDict(), self.PAYLOAD: OrderedDict()}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def file_key(path):
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def sizeof(value):
+        if isinstance(value, tuple):
+            return sum(ImageCache.sizeof(item) for item in value)
+        if isinstance(value, np.ndarray):
+            return value.nbytes
+        if isinstance(value, (bytes, bytearray)):
+            return len(value)
+        if isinstance(value, str):
+            return len(value.encode("utf-8"))
+        return 0
+
+    def configure(self, max_array_bytes=None, max_payload_bytes=None):
+        with self.lock:
+            if max_array_bytes is not None:
+                self.max_bytes[self.PIXELS] = max_array_bytes
+                self.evict(self.PIXELS)
+            if max_payload_bytes is not None:
+                self.max_bytes[self.PAYLOAD] = max_payload_bytes
+                self.evict(self.PAYLOAD)
+
+    # Values are stored as tuples so that a cached ``None`` payload (no
+    # hidden message) can be told apart from a cache miss.
+    def get(self, kind, key):
+        with self.lock:
+            entries = self.entries[kind]
+            if key in entries:
+                entries.move_to_end(key)
+                self.hits += 1
+                metrics.CACHE_REQUESTS.labels(kind, "hit").inc()
+                return entries[key][0]
+            self.misses += 1
+            metrics.CACHE_REQUESTS.labels(kind, "miss").inc()
+            return None
+
+    def put(self, kind, key, value):
+        size = self.sizeof(value)
+        with self.lock:
+            entries = self.entries[kind]
+            if key in entries:
+                self.used_bytes[kind] -= entries.pop(key)[1]
+            # values larger than the whole budget are simply not cached
+            if size > self.max_bytes[kind]:
+                return value
+            for item in value:
+                if isinstance(item, np.ndarray):
+                    item.setflags(write=False)
+            entries[key] = (value, size)
+            self.used_bytes[kind] += size
+            self.evict(kind)
+        return value
+
+    def evict(self, kind):
+        entries = self.entries[kind]
+        while self.used_bytes[kind] > self.max_bytes[kind] and entries:
+            _, (_, size) = entries.popitem(last=False)
+            self.used_bytes[kind] -= size
+            self.evictions += 1
+            metrics.CACHE_EVICTIONS.labels(kind).inc()
+
+    def invalidate(self, path):
+        path = os.path.abspath(path)
+        with self.lock:
+            for kind, entries in self.entries.items():
+                for key in [k for k in entries if k[0] == path]:
+                    self.used_bytes[kind] -= entries.pop(key)[1]
+
+    def clear(self):
+        with self.lock:
+            for kind in self.entries:
+                self.entries[kind].clear()
+                self.used_bytes[kind] = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "array_bytes": self.used_bytes[self.PIXELS],
+                "payload_bytes": self.used_bytes[self.PAYLOAD],
+                "array_entries": len(self.entries[self.PIXELS]),
+                "payload_entries": len(self.entries[self.PAYLOAD]),
+            }
+
+    def load_image(self, path):
+        # Returns (array, mode) for the image at path, see CarrierFormat.
+        # The array is read-only because it is shared; callers that modify
+        # pixels copy it.
+        key = self.file_key(path)
+        cached = self.get(self.PIXELS, key)
+        if cached is not None:
+            return cached
+        with metrics.STAGE_SECONDS.time("load"):
+            array, mode = CarrierFormat.load(path)
+        return self.put(self.PIXELS, key, (array, mode))
+
+    def cached_image(self, path):
+        # load_image's entry if it is already cached, without loading it or
+        # counting a request
+        key = self.file_key(path)
+        with self.lock:
+            entry = self.entries[self.PIXELS].get(key)
+        return entry[0] if entry is not None else None
+
+    def get_payload(self, path, extractor):
+        key = self.file_key(path)
+        cached = self.get(self.PAYLOAD, key)
+        if cached is not None:
+            return cached[0]
+        payload = extractor(path)
+        self.put(self.PAYLOAD, key, (payload,))
+        return payload
+
+
+image_cache = ImageCache()
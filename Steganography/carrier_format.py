@@ -0,0 +1,117 @@
+import io
+import os
+
+import cv2
+import numpy as np
+from PIL import Image
+
+
+class CarrierFormat:
+    # Pixel layouts the embedders accept and how they are read and written.
+    #
+    # 8-bit RGB, RGBA, L and LA, and 16-bit I;16 grayscale load through PIL
+    # as usual.  PIL opens 16-bit colour PNG / TIFF cut down to 8 bits, so
+    # those are read and written with cv2 (IMREAD_UNCHANGED) instead and
+    # get the modes "RGB;16" / "RGBA;16".  Palette images are converted to
+    # RGB(A) on load: their samples are indices, not intensities.
+    #
+    # Alpha never carries, so the carrier bands are the colour or gray
+    # bands only.  Arrays are uint8 or uint16; view() gives grayscale ones
+    # a band axis so the bit engine always sees (height, width, bands).
+    CHANNELS = {
+        "RGB": 3, "RGBA": 3, "L": 1, "LA": 1,
+        "I;16": 1, "I;16B": 1, "I;16L": 1,
+        "RGB;16": 3, "RGBA;16": 3,
+    }
+    WIDE_MODES = ("RGB;16", "RGBA;16")
+    # mode of a bare array by (bytes per sample, bands)
+    ARRAY_MODES = {
+        (1, 1): "L", (1, 2): "LA", (1, 3): "RGB", (1, 4): "RGBA",
+        (2, 1): "I;16", (2, 3): "RGB;16", (2, 4): "RGBA;16",
+    }
+    # formats cv2 writes 16-bit colour to
+    WIDE_FORMATS = {"PNG": ".png", "TIFF": ".tiff"}
+
+    def channels(mode):
+        if mode not in CarrierFormat.CHANNELS:
+            raise ValueError("Unsupported carrier mode: " + str(mode))
+        return CarrierFormat.CHANNELS[mode]
+
+    def view(array):
+        return array[:, :, None] if array.ndim == 2 else array
+
+    def pixels(array):
+        # (pixels, bands) view
+        array = CarrierFormat.view(array)
+        return array.reshape(-1, array.shape[-1])
+
+    def array_mode(array):
+        bands = 1 if array.ndim == 2 else array.shape[-1] if array.ndim == 3 else 0
+        mode = CarrierFormat.ARRAY_MODES.get((array.dtype.itemsize, bands))
+        if array.dtype.kind != "u" or mode is None:
+            raise ValueError("Expected a (height, width[, bands]) uint8 or uint16 array")
+        return mode
+
+    def max_depth(array):
+        # low bits per sample the embedders may use: up to half the sample
+        return array.dtype.itemsize * 4
+
+    def wide_mode(img):
+        # "RGB;16" / "RGBA;16" for 16-bit colour files PIL would narrow,
+        # else img.mode
+        if img.mode in ("RGB", "RGBA") and img.tile:
+            args = img.tile[0][3]
+            rawmode = args if isinstance(args, str) else args[0]
+            if ";16" in rawmode:
+                return img.mode + ";16"
+        return img.mode
+
+    def load(source):
+        # (array, mode) for an image file, given as a path or a binary file
+        with Image.open(source) as img:
+            mode = CarrierFormat.wide_mode(img)
+            if mode in CarrierFormat.WIDE_MODES:
+                if hasattr(source, "read"):
+                    source.seek(0)
+                    data = np.frombuffer(source.read(), dtype=np.uint8)
+                else:
+                    data = np.fromfile(source, dtype=np.uint8)
+                array = cv2.imdecode(data, cv2.IMREAD_UNCHANGED)
+                if array is None:
+                    raise ValueError("Can not read 16-bit image")
+                code = cv2.COLOR_BGR2RGB if mode == "RGB;16" else cv2.COLOR_BGRA2RGBA
+                return cv2.cvtColor(array, code), mode
+            if img.mode == "P":
+                img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+            return np.asarray(img), img.mode
+
+    def image(array, mode):
+        # PIL image for the 8-bit and I;16 modes (PIL picks the 16-bit
+        # byte order from the dtype)
+        if mode in CarrierFormat.WIDE_MODES:
+            raise ValueError("16-bit colour images have no PIL representation")
+        if array.dtype != np.uint8:
+            return Image.fromarray(array)
+        return Image.fromarray(array, mode)
+
+    def encode(array, mode, image_format):
+        # Encoded file bytes in image_format
+        if mode not in CarrierFormat.WIDE_MODES:
+            buffer = io.BytesIO()
+            CarrierFormat.image(array, mode).save(buffer, format=image_format)
+            return buffer.getvalue()
+        if image_format not in CarrierFormat.WIDE_FORMATS:
+            raise ValueError("16-bit colour carriers can only be saved as PNG or TIFF")
+        code = cv2.COLOR_RGB2BGR if mode == "RGB;16" else cv2.COLOR_RGBA2BGRA
+        ok, data = cv2.imencode(CarrierFormat.WIDE_FORMATS[image_format], cv2.cvtColor(array, code))
+        if not ok:
+            raise ValueError("Could not encode 16-bit image as " + image_format)
+        return data.tobytes()
+
+    def save(array, mode, dest):
+        if mode not in CarrierFormat.WIDE_MODES:
+            CarrierFormat.image(array, mode).save(dest)
+            return
+        image_format = Image.registered_extensions().get(os.path.splitext(dest)[1].lower())
+        with open(dest, "wb") as fo:
+            fo.write(CarrierFormat.encode(array, mode, image_format))
@@ -0,0 +1,153 @@
+import bisect
+import hashlib
+import os
+import sqlite3
+
+from PIL import Image
+
+from Monitoring import stego as metrics
+from .carrier_format import CarrierFormat
+from .encoding import Encoding
+from .matrix_embedding import MatrixEmbedding
+
+
+class CoverCatalog:
+    # SQLite index of a cover library.  scan() records each image's size,
+    # mode and content hash plus its payload capacity under every
+    # embedding configuration; files whose mtime and size are unchanged
+    # are skipped, so rescans only open new or modified images.  assign()
+    # then plans a batch of payloads onto covers from the index alone.
+    EXTENSIONS = (".png", ".bmp", ".tif", ".tiff", ".ppm", ".tga")
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS covers (
+            path TEXT PRIMARY KEY,
+            mtime_ns INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            width INTEGER NOT NULL,
+            height INTEGER NOT NULL,
+            mode TEXT NOT NULL,
+            sha256 TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS capacities (
+            path TEXT NOT NULL REFERENCES covers(path) ON DELETE CASCADE,
+            config TEXT NOT NULL,
+            bytes INTEGER NOT NULL,
+            PRIMARY KEY (path, config)
+        );
+        CREATE INDEX IF NOT EXISTS capacities_by_config ON capacities(config, bytes);
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.executescript(self.SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def config_name(mode=None, matrix_k=3):
+        if mode is None:
+            return "legacy"
+        if mode == "matrix":
+            return "matrix-" + str(matrix_k)
+        return mode
+
+    def configs():
+        # every (mode, matrix_k) the catalog keeps a capacity for
+        yield None, 3
+        yield "sequential", 3
+        yield "adaptive", 3
+        for k in range(MatrixEmbedding.MIN_K, MatrixEmbedding.MAX_K + 1):
+            yield "matrix", k
+
+    def file_hash(path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as fo:
+            for chunk in iter(lambda: fo.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def scan(self, *roots):
+        # Indexes every image under roots; returns (indexed, removed)
+        known = {path: (mtime, size) for path, mtime, size in
+                 self.db.execute("SELECT path, mtime_ns, size FROM covers")}
+        seen = set()
+        covers = []
+        capacities = []
+        with metrics.STAGE_SECONDS.time("catalog_scan"):
+            for root in roots:
+                for folder, _, names in os.walk(root):
+                    for name in names:
+                        if not name.lower().endswith(self.EXTENSIONS):
+                            continue
+                        path = os.path.abspath(os.path.join(folder, name))
+                        seen.add(path)
+                        stat = os.stat(path)
+                        if known.get(path) == (stat.st_mtime_ns, stat.st_size):
+                            continue
+                        try:
+                            # Image.open only parses the file header
+                            with Image.open(path) as img:
+                                (width, height), mode = img.size, CarrierFormat.wide_mode(img)
+                        except OSError:
+                            continue
+                        covers.append((path, stat.st_mtime_ns, stat.st_size, width, height, mode,
+                                       CoverCatalog.file_hash(path)))
+                        # palette covers are embedded as RGB, other modes can not carry
+                        channels = CarrierFormat.CHANNELS.get("RGB" if mode == "P" else mode)
+                        for config_mode, matrix_k in CoverCatalog.configs():
+                            pixels = width * height if channels else 0
+                            capacities.append((path, CoverCatalog.config_name(config_mode, matrix_k),
+                                               Encoding.capacity(pixels, config_mode, channels or 3, matrix_k)))
+
+            prefixes = tuple(os.path.join(os.path.abspath(root), "") for root in roots)
+            removed = [(path,) for path in known if path.startswith(prefixes) and path not in seen]
+            with self.db:
+                self.db.executemany("DELETE FROM covers WHERE path = ?", removed)
+                self.db.executemany("INSERT OR REPLACE INTO covers VALUES (?, ?, ?, ?, ?, ?, ?)", covers)
+                self.db.executemany("INSERT OR REPLACE INTO capacities VALUES (?, ?, ?)", capacities)
+        return len(covers), len(removed)
+
+    def cover(self, path):
+        row = self.db.execute("SELECT path, width, height, mode, sha256 FROM covers WHERE path = ?",
+                              (os.path.abspath(path),)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("path", "width", "height", "mode", "sha256"), row))
+
+    def capacity(self, path, mode=None, matrix_k=3):
+        row = self.db.execute("SELECT bytes FROM capacities WHERE path = ? AND config = ?",
+                              (os.path.abspath(path), CoverCatalog.config_name(mode, matrix_k))).fetchone()
+        return None if row is None else row[0]
+
+    def assign(self, sizes, mode=None, matrix_k=3, exclude=()):
+        # Best-fit plan for payloads of the given byte sizes: the largest
+        # payloads are placed first, each on the smallest unused cover that
+        # holds it.  Returns one cover path (or None) per payload, in the
+        # order given.  Covers in exclude are never used.
+        rows = self.db.execute("SELECT bytes, path FROM capacities WHERE config = ? ORDER BY bytes, path",
+                               (CoverCatalog.config_name(mode, matrix_k),)).fetchall()
+        excluded = {os.path.abspath(path) for path in exclude}
+        rows = [row for row in rows if row[1] not in excluded]
+        capacities = [row[0] for row in rows]
+
+        # next_free[i] leads to the first unused cover at or after i
+        # (union-find with path halving; len(rows) means none left)
+        next_free = list(range(len(rows) + 1))
+
+        def find(index):
+            while next_free[index] != index:
+                next_free[index] = next_free[next_free[index]]
+                index = next_free[index]
+            return index
+
+        plan = [None] * len(sizes)
+        for position in sorted(range(len(sizes)), key=lambda i: sizes[i], reverse=True):
+            index = find(bisect.bisect_left(capacities, sizes[position]))
+            if index == len(rows):
+                continue
+            plan[position] = rows[index][1]
+            next_free[index] = index + 1
+        return plan
@@ -1,36 +1,150 @@
-import numpy as np
-from PIL import Image
+from Monitoring import stego as metrics
+from .adaptive import AdaptiveSelector
+from .bit_engine import BitEngine
+from .cache import image_cache
+from .carrier_format import CarrierFormat
+from .header import StegoHeader
+from .matrix_embedding import MatrixEmbedding
+from .partial_read import PartialReader
 
 
 class Decoding:
     def decode(src):
-        img = Image.open(src, 'r')
-        array = np.array(list(img.getdata()))
-
-        if img.mode == 'RGB':
-            n = 3
-            total_pixels = array.size // n
-        elif img.mode == 'RGBA':
-            n = 4
-            total_pixels = array.size // n
-
-        hidden_bits = ""
-        for p in range(total_pixels):
-            for q in range(0, 3):
-                hidden_bits += (bin(array[p][q])[2:][-1])
-
-        hidden_bits = [hidden_bits[i:i + 8] for i in range(0, len(hidden_bits), 8)]
-
-        message = ""
-        for i in range(len(hidden_bits)):
-            if message[-5:] == "$t3g0":
-                break
-            else:
-                message += chr(int(hidden_bits[i], 2))
-        if "$t3g0" in message:
-            print("Hidden Message:", message[:-5])
-            return message[:-5]
+        with metrics.errors("decode"), metrics.STAGE_SECONDS.time("decode"):
+            message = image_cache.get_payload(src, Decoding.extract)
+        if message is not None:
+            metrics.OPERATIONS.labels("decode", "ok").inc()
+            metrics.BYTES_EXTRACTED.inc(len(message))
+            print("Hidden Message:", message)
+            return message
         else:
+            metrics.OPERATIONS.labels("decode", "empty").inc()
             print("No Hidden Message Found")
 
+    def extract(src):
+        cached = image_cache.cached_image(src)
+        if cached is None:
+            message = Decoding.extract_partial(src)
+            if message is not None:
+                return message
+        array, mode = image_cache.load_image(src)
+        if mode not in CarrierFormat.CHANNELS:
+            return None
+        return Decoding.extract_pixels(array, CarrierFormat.channels(mode))
+
+    def extract_partial(src):
+        # Reads the header rows first and then only the rows (or the ROI
+        # rectangle) that hold the payload.  Returns None when that is not
+        # enough to decide, e.g. legacy images or adaptive mode without an
+        # ROI, and extract() then falls back to a full load.
+        reader = PartialReader(src)
+        try:
+            if reader.mode not in CarrierFormat.CHANNELS or reader.mode in CarrierFormat.WIDE_MODES:
+                return None
+            channels = CarrierFormat.channels(reader.mode)
+            width, height = reader.width, reader.height
+            head_bits = StegoHeader.BITS + StegoHeader.ROI_BITS
+            head = CarrierFormat.view(reader.rows(0, min(height, Decoding.rows_needed(head_bits, width, channels))))
+            pixels = head.reshape(-1, head.shape[-1])
+            header = Decoding.read_header(pixels, channels)
+            if header is None:
+                return None
+
+            if header.flags & StegoHeader.FLAG_ROI:
+                if not Decoding.read_roi(header, pixels, width, height, channels):
+                    return None
+                left, top, roi_width, roi_height = header.roi
+                region = reader.region(left, top, left + roi_width, top + roi_height)
+                return Decoding.extract_payload(region, header, 0, channels)
+
+            count = header.length * 8
+            if header.mode == StegoHeader.MODE_SEQUENTIAL:
+                carriers = -(-count // header.depth)
+            elif header.mode == StegoHeader.MODE_MATRIX and MatrixEmbedding.MIN_K <= header.param <= MatrixEmbedding.MAX_K:
+                carriers = MatrixEmbedding.carriers_needed(count, header.param)
+            else:
+                return None
+            rows = min(height, Decoding.rows_needed(StegoHeader.BITS + carriers, width, channels))
+            return Decoding.extract_pixels(reader.rows(0, rows), channels)
+        finally:
+            reader.close()
+
+    def rows_needed(bits, width, channels=3):
+        return -(-(-(-bits // channels)) // width)
+
+    def read_header(pixels, channels=3):
+        if pixels.shape[0] * channels < StegoHeader.BITS:
+            return None
+        bits = BitEngine.extract_sequential(pixels, 0, StegoHeader.BITS, channels)
+        return StegoHeader.unpack(BitEngine.from_bits(bits))
+
+    def read_roi(header, pixels, width, height, channels=3):
+        # Fills header.roi from the bits after the header; False if they are
+        # missing or the rectangle does not fit a width x height image
+        if pixels.shape[0] * channels < header.total_bits:
+            return False
+        bits = BitEngine.extract_sequential(pixels, 0, header.total_bits, channels)
+        header.unpack_roi(BitEngine.from_bits(bits))
+        left, top, roi_width, roi_height = header.roi
+        return 0 < roi_width and left + roi_width <= width and 0 < roi_height and top + roi_height <= height
+
+    def extract_pixels(array, channels=3):
+        array = CarrierFormat.view(array)
+        pixels = array.reshape(-1, array.shape[-1])
+        header = Decoding.read_header(pixels, channels)
+        if header is None:
+            return Decoding.extract_legacy(pixels, channels)
+
+        if header.flags & StegoHeader.FLAG_ROI:
+            if not Decoding.read_roi(header, pixels, array.shape[1], array.shape[0], channels):
+                return None
+            left, top, width, height = header.roi
+            return Decoding.extract_payload(array[top:top + height, left:left + width], header, 0, channels)
+        return Decoding.extract_payload(array, header, StegoHeader.BITS, channels)
+
+    def extract_payload(carrier, header, start, channels=3):
+        # Mirror of Encoding.embed_payload: reads the payload from carrier
+        # bit `start` on, checks it against the header and returns it as
+        # str or bytes, or None.
+        carrier = CarrierFormat.view(carrier)
+        pixels = carrier.reshape(-1, carrier.shape[-1])
+        capacity = pixels.shape[0] * channels
+        count = header.length * 8
+
+        if header.mode == StegoHeader.MODE_ADAPTIVE:
+            skip = -(-start // channels)
+            needed = -(-count // channels)
+            if skip + needed > pixels.shape[0]:
+                return None
+            indices = AdaptiveSelector.select(carrier, needed, skip, channels)
+            payload = BitEngine.from_bits(BitEngine.extract_at(pixels, indices, count, channels))
+        elif header.mode == StegoHeader.MODE_SEQUENTIAL:
+            depth = header.depth
+            if depth > CarrierFormat.max_depth(carrier) or start + -(-count // depth) > capacity:
+                return None
+            payload = BitEngine.extract_bytes(pixels, start, header.length, channels, depth=depth)
+        elif header.mode == StegoHeader.MODE_MATRIX:
+            k = header.param
+            if not MatrixEmbedding.MIN_K <= k <= MatrixEmbedding.MAX_K:
+                return None
+            if start + MatrixEmbedding.carriers_needed(count, k) > capacity:
+                return None
+            payload = BitEngine.from_bits(MatrixEmbedding.extract(pixels, count, start, k, channels))
+        else:
+            return None
+
+        if not header.check(payload):
+            return None
+        if header.flags & StegoHeader.FLAG_TEXT:
+            return payload.decode("utf-8")
+        return payload
+
+    def extract_legacy(pixels, channels=3):
+        # LSBs of the R, G and B channels in pixel order, packed back into
+        # bytes so the terminator can be searched for without a Python loop
+        hidden_bytes = BitEngine.extract_bytes(pixels, 0, pixels.shape[0] * channels // 8, channels)
 
+        end = hidden_bytes.find(b"$t3g0")
+        if end == -1:
+            return None
+        return hidden_bytes[:end].decode("latin-1")
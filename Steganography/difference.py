@@ -3,13 +3,28 @@ import cv2
 from math import log10, sqrt
 from PIL import Image
 from skimage.metrics import structural_similarity as ssim
+
+from .cache import image_cache
+from .tiled_metrics import TiledMetrics
+
+
 class DifferenceStego:
+    def loadImage(path):
+        # Same 3-channel BGR layout as cv2.imread(path), but served from the
+        # shared image cache so repeated comparisons skip the PNG decode.
+        array, mode = image_cache.load_image(path)
+        if array.ndim == 3 and array.shape[2] < 3:
+            array = array[:, :, 0]
+        if array.ndim == 2:
+            return cv2.cvtColor(np.ascontiguousarray(array), cv2.COLOR_GRAY2BGR)
+        return np.ascontiguousarray(array[:, :, 2::-1])
+
     def calculatePSNR(original, compressed):
         mse = np.mean((original - compressed) ** 2)
         if(mse == 0):  # MSE is zero means no noise is present in the signal .
                       # Therefore PSNR have no importance.
             return 100
-        max_pixel = 255.0
+        max_pixel = float(np.iinfo(original.dtype).max)
         psnr = 20 * log10(max_pixel / sqrt(mse))
         return psnr
 
@@ -19,7 +34,7 @@ class DifferenceStego:
         return mse
 
 
-    def calculateSSIM(imageA, imageB):
+    def calculateSSIM(imageA, imageB, full=False):
         # 4. Convert the images to grayscale
         grayA = cv2.cvtColor(imageA, cv2.COLOR_BGR2GRAY)
         grayB = cv2.cvtColor(imageB, cv2.COLOR_BGR2GRAY)
@@ -27,8 +42,55 @@ class DifferenceStego:
         # 5. Compute the Structural Similarity Index (SSIM) between the two
         #    images, ensuring that the difference image is returned
         (score, diff) = ssim(grayA, grayB, full=True)
-        diff = (diff * 255).astype("uint8")
-        # 6. You can print only the score if you want
-        # print("SSIM: {}".format(score))
+        # 6. Callers that want to visualise the SSIM map ask for it with
+        #    full=True instead of recomputing it
+        if full:
+            return score, diff
         return score
 
+    def calculateLSBDifference(imageA, imageB):
+        # Number of channels that differ per pixel (0..3).  Stays uint8 so a
+        # 50 MP comparison does not allocate wide intermediate arrays.
+        changed = np.not_equal(imageA, imageB)
+        if changed.ndim == 3:
+            return changed.sum(axis=2, dtype=np.uint8)
+        return changed.astype(np.uint8)
+
+    def heatmapSize(width, height, max_size=(480, 320)):
+        # (width, height) of the preview: at most max_size, never enlarged
+        scale = min(max_size[0] / width, max_size[1] / height, 1.0)
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
+    def renderHeatmap(values, max_size=(480, 320), colormap=cv2.COLORMAP_INFERNO):
+        # Area-average the full resolution map down to at most max_size
+        # (width, height) and return it as a compressed PNG, so the GUI only
+        # ever receives a screen sized image.
+        height, width = values.shape[:2]
+        size = DifferenceStego.heatmapSize(width, height, max_size)
+        small = cv2.resize(values.astype(np.float32), size, interpolation=cv2.INTER_AREA)
+        return DifferenceStego.colorizeHeatmap(small, colormap)
+
+    def colorizeHeatmap(small, colormap=cv2.COLORMAP_INFERNO):
+        # preview sized map -> PNG, scaled so its peak is the hottest colour
+        peak = float(small.max())
+        if peak > 0:
+            small = small * (255.0 / peak)
+        heatmap = cv2.applyColorMap(small.astype(np.uint8), colormap)
+        ok, png = cv2.imencode(".png", heatmap, [cv2.IMWRITE_PNG_COMPRESSION, 9])
+        return png.tobytes()
+
+    def calculateHeatmap(imageA, imageB, kind="lsb", max_size=(480, 320), ssim_map=None):
+        # kind="lsb" shows where pixels were modified, kind="ssim" shows
+        # structural dissimilarity (1 - local SSIM).  Without an ssim_map
+        # (as returned by calculateSSIM(full=True)) the SSIM map is built
+        # tile by tile at preview size, so memory stays bounded by the tile
+        # size however large the images are.
+        if kind == "ssim":
+            if ssim_map is None:
+                height, width = imageA.shape[:2]
+                size = DifferenceStego.heatmapSize(width, height, max_size)
+                return DifferenceStego.colorizeHeatmap(TiledMetrics().dissimilarity_map(imageA, imageB, size))
+            values = np.clip(1.0 - ssim_map, 0.0, 1.0)
+        else:
+            values = DifferenceStego.calculateLSBDifference(imageA, imageB)
+        return DifferenceStego.renderHeatmap(values, max_size)
@@ -1,36 +1,283 @@
+import hashlib
+import os
+
 import numpy as np
 from PIL import Image
 
+from Monitoring import stego as metrics
+from .adaptive import AdaptiveSelector
+from .bit_engine import BitEngine
+from .cache import image_cache
+from .carrier_format import CarrierFormat
+from .decoding import Decoding
+from .header import StegoHeader
+from .matrix_embedding import MatrixEmbedding
+from .raw_carrier import RawCarrier
+
 
 class Encoding:
-    def encode(src, message, dest):
-        img = Image.open(src, 'r')
-        print(message)
-        width, height = img.size
-        array = np.array(list(img.getdata()))
+    # mode=None keeps the original "$t3g0" terminated text format.  The
+    # framed modes ("sequential", "adaptive") write a StegoHeader into the
+    # first LSBs and accept either str or bytes payloads.  "matrix" mode
+    # uses a Hamming code of order matrix_k, see MatrixEmbedding.
+    #
+    # roi=(left, top, width, height) keeps the payload inside a rectangle
+    # so the decoder only has to load that region (see PartialReader).
+    #
+    # Carriers may be RGB(A), L, LA, I;16 or 16-bit colour (CarrierFormat);
+    # capacity follows the carrier bands.  depth=n hides n low bits in
+    # every sample in sequential mode, up to half the sample width, which
+    # on 16-bit images is still far below the sensor noise.
+    #
+    # verify=True re-extracts the payload from the modified pixels before
+    # saving and, for lossless formats, checks the written file by hash
+    # instead of decoding it again.
+    #
+    # store=ResultStore(...) answers a repeated (cover, payload, settings)
+    # job with a copy of the earlier output instead of embedding again.
+    LOSSLESS_FORMATS = ("PNG", "BMP", "TIFF", "PPM", "TGA")
+
+    def encode(src, message, dest, mode=None, matrix_k=3, verify=False, roi=None, store=None, depth=1):
+        if store is not None:
+            key = store.job_key(src, message, dest, mode=mode, matrix_k=matrix_k, roi=roi, depth=depth)
+            if store.fetch(key, dest):
+                image_cache.invalidate(dest)
+                metrics.OPERATIONS.labels("encode", "cached").inc()
+                print("Image Encoded Successfully")
+                return True
+        with metrics.errors("encode"), metrics.STAGE_SECONDS.time("encode"):
+            encoded = Encoding.embed(src, message, dest, mode, matrix_k, verify, roi, depth)
+        metrics.OPERATIONS.labels("encode", "ok" if encoded else "error").inc()
+        if encoded and store is not None:
+            store.put(key, dest)
+        return encoded
 
-        if img.mode == 'RGB':
-            n = 3
-            total_pixels = array.size // n
-        elif img.mode == 'RGBA':
-            n = 4
-            total_pixels = array.size // n
+    def embed(src, message, dest, mode=None, matrix_k=3, verify=False, roi=None, depth=1):
+        cover, image_mode = image_cache.load_image(src)
+        channels = CarrierFormat.channels(image_mode)
+        print(message)
 
-        message += "$t3g0"
-        b_message = ''.join([format(ord(i), "08b") for i in message])
-        req_pixels = len(b_message)
+        # the cached cover is shared and read-only, embed into a private copy
+        array = cover.copy()
 
-        if req_pixels > total_pixels:
+        touched = Encoding.embed_pixels(array, message, mode, channels, matrix_k, roi, depth)
+        if touched is None:
             print("ERROR: Need larger file size")
+            metrics.CAPACITY_FAILURES.inc()
+            return False
+
+        if verify and not Encoding.verify_pixels(array, message, mode, matrix_k, channels):
+            print("ERROR: Embedded payload did not verify")
+            return False
+
+        with metrics.STAGE_SECONDS.time("save"):
+            if verify:
+                saved = Encoding.save_verified(array, image_mode, dest, message, mode, channels)
+            else:
+                CarrierFormat.save(array, image_mode, dest)
+                saved = True
+        image_cache.invalidate(dest)
+        if not saved:
+            print("ERROR: Saved image did not verify")
+            return False
+        metrics.BYTES_EMBEDDED.inc(len(message))
+        metrics.PIXELS_TOUCHED.inc(touched)
+        print("Image Encoded Successfully")
+        return True
+
+    def verify_pixels(array, message, mode=None, matrix_k=3, channels=3):
+        # Header CRC and payload are checked on the in-memory buffer; for
+        # sequential modes only the leading carrier pixels are read back
+        array = CarrierFormat.view(array)
+        if mode is None:
+            needed = Encoding.pixels_needed(message, channels=channels)
+            pixels = array.reshape(-1, array.shape[-1])[:needed]
+            ok = Decoding.extract_legacy(pixels, channels) == message
+        else:
+            ok = Decoding.extract_pixels(array, channels) == message
+        metrics.OPERATIONS.labels("verify", "ok" if ok else "error").inc()
+        return ok
+
+    def save_verified(array, image_mode, dest, message, mode=None, channels=3):
+        # Lossless formats: encode once in memory, write those bytes, and
+        # confirm the file on disk hashes the same.  Lossy formats can not
+        # carry LSBs reliably, so they are decoded once more to find out.
+        image_format = Image.registered_extensions().get(os.path.splitext(dest)[1].lower())
+        if image_format not in Encoding.LOSSLESS_FORMATS:
+            CarrierFormat.save(array, image_mode, dest)
+            image_cache.invalidate(dest)
+            return Decoding.extract(dest) == message
+
+        data = CarrierFormat.encode(array, image_mode, image_format)
+        expected = hashlib.sha256(data).digest()
+        with open(dest, "wb") as fo:
+            fo.write(data)
+
+        digest = hashlib.sha256()
+        with open(dest, "rb") as fo:
+            for chunk in iter(lambda: fo.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.digest() == expected
+
+    def encode_inplace(path, message, mode=None, matrix_k=3, verify=False, depth=1):
+        # Embeds straight into an uncompressed BMP / PPM / PGM / TIFF
+        # through a memory map: only the rows that carry payload bits are
+        # read, modified and flushed, so the cost follows the payload size
+        # rather than the image size.  Sequential carrier modes only, since
+        # adaptive selection needs every pixel.
+        if mode == "adaptive":
+            raise ValueError("In-place embedding supports sequential carrier modes only")
+        carrier = RawCarrier.open(path, writable=True)
+        if carrier is None:
+            raise ValueError("Not an uncompressed BMP, PPM or TIFF carrier: " + str(path))
+        channels = CarrierFormat.channels(carrier.mode)
+
+        try:
+            with metrics.errors("encode_inplace"), metrics.STAGE_SECONDS.time("encode_inplace"):
+                needed = Encoding.pixels_needed(message, mode, channels, matrix_k, depth)
+                if needed > carrier.height * carrier.width:
+                    print("ERROR: Need larger file size")
+                    metrics.CAPACITY_FAILURES.inc()
+                    metrics.OPERATIONS.labels("encode_inplace", "error").inc()
+                    return False
+
+                rows = -(-needed // carrier.width)
+                block = np.array(carrier.pixels[:rows])
+                touched = Encoding.embed_pixels(block, message, mode, channels, matrix_k, depth=depth)
+                if verify and not Encoding.verify_pixels(block, message, mode, matrix_k, channels):
+                    print("ERROR: Embedded payload did not verify")
+                    metrics.OPERATIONS.labels("encode_inplace", "error").inc()
+                    return False
+                carrier.pixels[:rows] = block
+                carrier.flush_rows(0, rows)
+        finally:
+            carrier.close()
+
+        image_cache.invalidate(path)
+        metrics.BYTES_EMBEDDED.inc(len(message))
+        metrics.PIXELS_TOUCHED.inc(touched)
+        metrics.OPERATIONS.labels("encode_inplace", "ok").inc()
+        print("Image Encoded Successfully")
+        return True
+
+    def pixels_needed(message, mode=None, channels=3, matrix_k=3, depth=1):
+        # Leading pixels a sequential carrier mode writes for this message
+        if mode is None:
+            bits = (len(message.encode("latin-1")) + 5) * 8
+        else:
+            payload_bits = len(Encoding.payload_bytes(message)[0]) * 8
+            if mode == "matrix":
+                payload_bits = MatrixEmbedding.carriers_needed(payload_bits, matrix_k)
+            bits = StegoHeader.BITS + -(-payload_bits // depth)
+        return -(-bits // channels)
+
+    def capacity(pixel_count, mode=None, channels=3, matrix_k=3, depth=1):
+        # Largest payload in bytes (latin-1 characters for the legacy
+        # format) that fits a cover of pixel_count pixels
+        bits = pixel_count * channels
+        if mode is None:
+            return max(0, bits // 8 - 5)
+        if mode == "adaptive":
+            bits = (pixel_count - -(-StegoHeader.BITS // channels)) * channels
         else:
-            index = 0
-            for p in range(total_pixels):
-                for q in range(0, 3):
-                    if index < req_pixels:
-                        array[p][q] = int(bin(array[p][q])[2:9] + b_message[index], 2)
-                        index += 1
-
-            array = array.reshape(height, width, n)
-            enc_img = Image.fromarray(array.astype('uint8'), img.mode)
-            enc_img.save(dest)
-            print("Image Encoded Successfully")
+            bits = (bits - StegoHeader.BITS) * depth
+        if mode == "matrix":
+            bits = bits // MatrixEmbedding.block_size(matrix_k) * matrix_k
+        return max(0, bits // 8)
+
+    def payload_bytes(message):
+        if isinstance(message, str):
+            return message.encode("utf-8"), StegoHeader.FLAG_TEXT
+        return bytes(message), 0
+
+    def embed_pixels(array, message, mode=None, channels=3, matrix_k=3, roi=None, depth=1):
+        # Embeds into the (height, width[, bands]) array in place and returns
+        # the number of pixels rewritten, or None if the message does not fit.
+        # roi=(left, top, width, height) confines the payload to that
+        # rectangle; only the header stays at the start of the image.
+        array = CarrierFormat.view(array)
+        if depth != 1 and mode != "sequential":
+            raise ValueError("Several bits per sample need the sequential mode")
+        if not 1 <= depth <= CarrierFormat.max_depth(array):
+            raise ValueError("depth must be between 1 and half the sample width")
+        pixels = array.reshape(-1, array.shape[-1])
+        capacity = pixels.shape[0] * channels
+
+        if mode is None:
+            if roi is not None:
+                raise ValueError("ROI embedding needs a framed mode")
+            if not isinstance(message, str):
+                raise ValueError("The legacy format carries text only, binary payloads need a framed mode")
+            data = (message + "$t3g0").encode("latin-1")
+            if len(data) * 8 > capacity:
+                return None
+            BitEngine.embed_bytes(pixels, data, 0, channels)
+            return -(-len(data) * 8 // channels)
+
+        payload, flags = Encoding.payload_bytes(message)
+        mode_id = StegoHeader.MODES[mode]
+        param = 0
+        if mode_id == StegoHeader.MODE_MATRIX:
+            if not MatrixEmbedding.MIN_K <= matrix_k <= MatrixEmbedding.MAX_K:
+                raise ValueError("matrix_k must be between 1 and 8")
+            param = matrix_k
+        elif depth > 1:
+            param = depth
+        header = StegoHeader.for_payload(mode_id, payload, flags, param, roi)
+        header_bits = BitEngine.to_bits(header.pack())
+        header_pixels = -(-len(header_bits) // channels)
+        if header_pixels > pixels.shape[0]:
+            return None
+
+        if roi is None:
+            touched = Encoding.embed_payload(array, payload, header, len(header_bits), channels)
+        else:
+            left, top, width, height = roi
+            if (width <= 0 or height <= 0 or left + width > array.shape[1]
+                    or top + height > array.shape[0]):
+                raise ValueError("ROI lies outside the image")
+            if top * array.shape[1] + left < header_pixels:
+                raise ValueError("ROI overlaps the header pixels at the start of the image")
+            region = array[top:top + height, left:left + width].copy()
+            touched = Encoding.embed_payload(region, payload, header, 0, channels)
+            if touched is not None:
+                array[top:top + height, left:left + width] = region
+        if touched is None:
+            return None
+        BitEngine.embed_sequential(pixels, header_bits, 0, channels)
+        return header_pixels + touched
+
+    def embed_payload(carrier, payload, header, start, channels=3):
+        # Places the payload bytes in carrier (the whole image or an ROI
+        # block) from carrier bit `start` on.  Returns the pixels used, or
+        # None.  Sequential payloads go through the chunked, multi-threaded
+        # BitEngine.embed_bytes.
+        pixels = carrier.reshape(-1, carrier.shape[-1])
+        capacity = pixels.shape[0] * channels
+        count = len(payload) * 8
+
+        if header.mode == StegoHeader.MODE_SEQUENTIAL:
+            samples = -(-count // header.depth)
+            if start + samples > capacity:
+                return None
+            BitEngine.embed_bytes(pixels, payload, start, channels, depth=header.depth)
+            return -(-(start + samples) // channels) - start // channels
+
+        bits = BitEngine.to_bits(payload)
+
+        if header.mode == StegoHeader.MODE_ADAPTIVE:
+            skip = -(-start // channels)
+            needed = -(-len(bits) // channels)
+            if skip + needed > pixels.shape[0]:
+                return None
+            indices = AdaptiveSelector.select(carrier, needed, skip, channels)
+            BitEngine.embed_at(pixels, indices, bits, channels)
+            return needed
+
+        if header.mode == StegoHeader.MODE_MATRIX:
+            carriers = MatrixEmbedding.carriers_needed(len(bits), header.param)
+            if start + carriers > capacity:
+                return None
+            MatrixEmbedding.embed(pixels, bits, start, header.param, channels)
+            return -(-(start + carriers) // channels) - start // channels
+        return None
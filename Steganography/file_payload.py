@@ -0,0 +1,168 @@
+import os
+import struct
+import tempfile
+import zlib
+
+from Monitoring import stego as metrics
+from .bit_engine import BitEngine
+from .cache import image_cache
+from .carrier_format import CarrierFormat
+from .decoding import Decoding
+from .header import StegoHeader
+
+
+class FilePayload:
+    # Arbitrary files as payloads, streamed in chunks so neither the file
+    # nor the payload is ever held whole in memory or as str:
+    #
+    #   read chunk -> zlib -> (segmented GCM) -> LSBs after the header
+    #
+    # The zlib stream starts with a small record holding the original file
+    # name and size, so it is compressed (and encrypted) with the data.
+    # The StegoHeader is written last, once length and CRC are known, with
+    # FLAG_FILE set.  Sequential carrier layout only, since the payload is
+    # placed chunk by chunk.
+    MAGIC = b"SFP\x01"
+    # magic, name length, file size; the utf-8 name follows
+    META = struct.Struct("<4sHQ")
+    CHUNK_SIZE = 1 << 20
+
+    def encode(src, payload_path, dest, encrypter=None, chunk_size=CHUNK_SIZE):
+        with metrics.errors("encode_file"), metrics.STAGE_SECONDS.time("encode"):
+            encoded = FilePayload.embed(src, payload_path, dest, encrypter, chunk_size)
+        metrics.OPERATIONS.labels("encode_file", "ok" if encoded else "error").inc()
+        return encoded
+
+    def embed(src, payload_path, dest, encrypter=None, chunk_size=CHUNK_SIZE):
+        cover, image_mode = image_cache.load_image(src)
+        channels = CarrierFormat.channels(image_mode)
+        array = cover.copy()
+        pixels = CarrierFormat.pixels(array)
+        capacity = pixels.shape[0] * channels
+
+        stream = FilePayload.compress(payload_path, chunk_size)
+        if encrypter is not None:
+            stream = encrypter.encrypt_stream(stream)
+
+        start = StegoHeader.BITS
+        crc = 0
+        for chunk in stream:
+            if start + len(chunk) * 8 > capacity:
+                print("ERROR: Need larger file size")
+                metrics.CAPACITY_FAILURES.inc()
+                return False
+            BitEngine.embed_bytes(pixels, chunk, start, channels)
+            start += len(chunk) * 8
+            crc = zlib.crc32(chunk, crc)
+
+        length = (start - StegoHeader.BITS) // 8
+        header = StegoHeader(StegoHeader.MODE_SEQUENTIAL, length, crc, StegoHeader.FLAG_FILE)
+        BitEngine.embed_sequential(pixels, BitEngine.to_bits(header.pack()), 0, channels)
+
+        with metrics.STAGE_SECONDS.time("save"):
+            CarrierFormat.save(array, image_mode, dest)
+        image_cache.invalidate(dest)
+        metrics.BYTES_EMBEDDED.inc(length)
+        metrics.PIXELS_TOUCHED.inc(-(-start // channels))
+        print("Image Encoded Successfully")
+        return True
+
+    def compress(path, chunk_size=CHUNK_SIZE):
+        compressor = zlib.compressobj()
+        name = os.path.basename(path).encode("utf-8")
+        meta = FilePayload.META.pack(FilePayload.MAGIC, len(name), os.path.getsize(path)) + name
+        yield compressor.compress(meta)
+        with open(path, "rb") as fo:
+            for chunk in iter(lambda: fo.read(chunk_size), b""):
+                data = compressor.compress(chunk)
+                if data:
+                    yield data
+        yield compressor.flush()
+
+    def decode(src, out_dir, decrypter=None, chunk_size=CHUNK_SIZE):
+        # Writes the hidden file into out_dir under its original name and
+        # returns its path, or None when src holds no file payload.  The
+        # file only appears once size and CRC check out; a Decrypter raises
+        # ValueError on tampering as usual.
+        array, mode = image_cache.load_image(src)
+        if mode not in CarrierFormat.CHANNELS:
+            return None
+        channels = CarrierFormat.channels(mode)
+        pixels = CarrierFormat.pixels(array)
+        header = Decoding.read_header(pixels, channels)
+        if (header is None or not header.flags & StegoHeader.FLAG_FILE
+                or header.mode != StegoHeader.MODE_SEQUENTIAL or header.depth != 1):
+            return None
+        if StegoHeader.BITS + header.length * 8 > pixels.shape[0] * channels:
+            return None
+
+        crc = [0]
+
+        def raw():
+            for offset in range(0, header.length, chunk_size):
+                count = min(chunk_size, header.length - offset)
+                data = BitEngine.extract_bytes(pixels, StegoHeader.BITS + offset * 8, count, channels)
+                crc[0] = zlib.crc32(data, crc[0])
+                yield data
+
+        stream = raw()
+        if decrypter is not None:
+            stream = decrypter.decrypt_stream(stream)
+
+        os.makedirs(out_dir, exist_ok=True)
+        fd, temp = tempfile.mkstemp(dir=out_dir, suffix=".part")
+        try:
+            with metrics.errors("decode_file"), metrics.STAGE_SECONDS.time("decode"), os.fdopen(fd, "wb") as fo:
+                name, size = FilePayload.inflate(stream, fo, chunk_size)
+            if name is None or crc[0] != header.crc or os.path.getsize(temp) != size:
+                os.remove(temp)
+                metrics.OPERATIONS.labels("decode_file", "error").inc()
+                return None
+            path = os.path.join(out_dir, name)
+            os.replace(temp, path)
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+        metrics.OPERATIONS.labels("decode_file", "ok").inc()
+        metrics.BYTES_EXTRACTED.inc(header.length)
+        return path
+
+    def inflate(stream, fo, chunk_size=CHUNK_SIZE):
+        # Decompresses stream into fo and returns (name, size) from the
+        # leading record, or (None, None) if it is missing or malformed.
+        # Output is produced at most chunk_size bytes at a time and stops
+        # once the recorded size is exceeded.
+        decompressor = zlib.decompressobj()
+        head = bytearray()
+        name = size = None
+        written = 0
+        try:
+            for data in stream:
+                while data:
+                    out = decompressor.decompress(data, chunk_size)
+                    data = decompressor.unconsumed_tail
+                    if name is None:
+                        head += out
+                        if len(head) < FilePayload.META.size:
+                            continue
+                        magic, name_length, size = FilePayload.META.unpack_from(head)
+                        if magic != FilePayload.MAGIC:
+                            return None, None
+                        if len(head) < FilePayload.META.size + name_length:
+                            size = None
+                            continue
+                        end = FilePayload.META.size + name_length
+                        name = os.path.basename(head[FilePayload.META.size:end].decode("utf-8").replace("\\", "/"))
+                        if name in ("", ".", ".."):
+                            return None, None
+                        out = bytes(head[end:])
+                    written += len(out)
+                    if written > size:
+                        return None, None
+                    fo.write(out)
+        except (zlib.error, UnicodeDecodeError):
+            return None, None
+        if name is None or not decompressor.eof:
+            return None, None
+        return name, size
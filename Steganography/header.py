@@ -0,0 +1,83 @@
+import struct
+import zlib
+
+
+class StegoHeader:
+    # Fixed-position header written into the first channel LSBs (same bit
+    # order as the legacy "$t3g0" format) by every framed embedding mode.
+    # Images without the magic are decoded with the legacy terminator scan.
+    MAGIC = b"\x89SGH"
+    VERSION = 1
+    # magic, version, mode, flags, mode parameter, payload length, crc32
+    STRUCT = struct.Struct("<4sBBBBQI")
+    SIZE = STRUCT.size
+    BITS = SIZE * 8
+
+    # param holds the low bits used per sample, 0 meaning 1
+    MODE_SEQUENTIAL = 0
+    MODE_ADAPTIVE = 1
+    # param holds k, the Hamming code order
+    MODE_MATRIX = 2
+    MODES = {
+        "sequential": MODE_SEQUENTIAL,
+        "adaptive": MODE_ADAPTIVE,
+        "matrix": MODE_MATRIX,
+    }
+
+    # payload was given as str and is returned as str
+    FLAG_TEXT = 0x01
+    # an ROI rectangle (left, top, width, height) follows the header and
+    # the payload is embedded inside that rectangle only
+    FLAG_ROI = 0x02
+    ROI_STRUCT = struct.Struct("<IIII")
+    ROI_BITS = ROI_STRUCT.size * 8
+    # the payload is a FilePayload container (compressed, maybe encrypted)
+    FLAG_FILE = 0x04
+
+    def __init__(self, mode, length, crc, flags=0, param=0, roi=None):
+        self.mode = mode
+        self.length = length
+        self.crc = crc
+        self.flags = flags
+        self.param = param
+        self.roi = roi
+        if roi is not None:
+            self.flags |= self.FLAG_ROI
+
+    @staticmethod
+    def for_payload(mode, payload, flags=0, param=0, roi=None):
+        return StegoHeader(mode, len(payload), zlib.crc32(payload), flags, param, roi)
+
+    @property
+    def total_bits(self):
+        return self.BITS + (self.ROI_BITS if self.flags & self.FLAG_ROI else 0)
+
+    @property
+    def depth(self):
+        # low bits per carrier sample holding the payload
+        if self.mode == self.MODE_SEQUENTIAL:
+            return self.param or 1
+        return 1
+
+    def pack(self):
+        data = self.STRUCT.pack(self.MAGIC, self.VERSION, self.mode, self.flags, self.param, self.length, self.crc)
+        if self.roi is not None:
+            data += self.ROI_STRUCT.pack(*self.roi)
+        return data
+
+    @staticmethod
+    def unpack(data):
+        # Returns None when data does not start with a framed header.  For
+        # ROI headers, call unpack_roi with the following ROI_BITS as well.
+        if len(data) < StegoHeader.SIZE:
+            return None
+        magic, version, mode, flags, param, length, crc = StegoHeader.STRUCT.unpack_from(data)
+        if magic != StegoHeader.MAGIC or version != StegoHeader.VERSION:
+            return None
+        return StegoHeader(mode, length, crc, flags, param)
+
+    def unpack_roi(self, data):
+        self.roi = self.ROI_STRUCT.unpack_from(data, self.SIZE)
+
+    def check(self, payload):
+        return len(payload) == self.length and zlib.crc32(payload) == self.crc
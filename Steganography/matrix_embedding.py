@@ -0,0 +1,77 @@
+import numpy as np
+
+from .bit_engine import BitEngine
+
+
+class MatrixEmbedding:
+    # Hamming-code matrix embedding ("matrix" mode).
+    #
+    # The carrier LSBs are cut into blocks of n = 2**k - 1.  A block carries
+    # k message bits as its syndrome, the XOR of the 1-based positions of
+    # its set LSBs.  Making the syndrome equal the message needs at most one
+    # flipped LSB per block: the one at position syndrome ^ message.  That is
+    # k bits for at most one change, against about k / 2 changes with plain
+    # LSB replacement, at the price of n / k carriers per bit.
+    MIN_K = 1
+    MAX_K = 8
+
+    def block_size(k):
+        return (1 << k) - 1
+
+    def carriers_needed(bit_count, k):
+        return -(-bit_count // k) * MatrixEmbedding.block_size(k)
+
+    def syndromes(lsbs, k):
+        # lsbs is (blocks, n).  For short blocks a loop over the n columns,
+        # each step a whole-array XOR over all blocks, is fastest; for long
+        # blocks the parity-check product lsbs @ H runs through BLAS instead
+        # (counts stay below 2**24, so float32 is exact).
+        n = lsbs.shape[1]
+        if k <= 4:
+            syndrome = np.zeros(lsbs.shape[0], dtype=np.uint8)
+            for column in range(n):
+                syndrome ^= lsbs[:, column] * np.uint8(column + 1)
+            return syndrome
+        shifts = np.arange(k - 1, -1, -1)
+        parity_check = ((np.arange(1, n + 1)[:, None] >> shifts) & 1).astype(np.float32)
+        parity = (lsbs.astype(np.float32) @ parity_check).astype(np.uint8) & 1
+        syndrome = np.zeros(lsbs.shape[0], dtype=np.uint8)
+        for column in range(k):
+            syndrome <<= 1
+            syndrome |= parity[:, column]
+        return syndrome
+
+    def pack_message(bits, k):
+        # k bits per block, most significant first, as one uint8 per block
+        blocks = -(-len(bits) // k)
+        padded = np.zeros(blocks * k, dtype=np.uint8)
+        padded[:len(bits)] = bits
+        columns = padded.reshape(blocks, k)
+        value = np.zeros(blocks, dtype=np.uint8)
+        for column in range(k):
+            value <<= 1
+            value |= columns[:, column]
+        return value
+
+    def embed(pixels, bits, start, k, channels=3):
+        # Returns the number of LSBs that actually changed
+        n = MatrixEmbedding.block_size(k)
+        count = MatrixEmbedding.carriers_needed(len(bits), k)
+        lsbs = BitEngine.extract_sequential(pixels, start, count, channels)
+
+        blocks = lsbs.reshape(-1, n)
+        flip = MatrixEmbedding.syndromes(blocks, k) ^ MatrixEmbedding.pack_message(bits, k)
+        changed = np.flatnonzero(flip)
+        lsbs[changed * n + flip[changed] - 1] ^= 1
+
+        BitEngine.embed_sequential(pixels, lsbs, start, channels)
+        return len(changed)
+
+    def extract(pixels, bit_count, start, k, channels=3):
+        n = MatrixEmbedding.block_size(k)
+        count = MatrixEmbedding.carriers_needed(bit_count, k)
+        lsbs = BitEngine.extract_sequential(pixels, start, count, channels)
+
+        syndrome = MatrixEmbedding.syndromes(lsbs.reshape(-1, n), k)
+        bits = np.unpackbits(syndrome[:, None], axis=1)[:, 8 - k:]
+        return bits.reshape(-1)[:bit_count]
@@ -0,0 +1,87 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from Monitoring import stego as metrics
+from .carrier_format import CarrierFormat
+from .decoding import Decoding
+from .encoding import Encoding
+
+
+class MemoryStego:
+    # Encode / decode without touching the filesystem, for services that
+    # receive images over sockets.  Images may be given as
+    #
+    #   - a (height, width[, bands]) uint8 or uint16 NumPy array, or any
+    #     buffer-protocol object with that shape: used as is, without a copy
+    #   - a PIL image
+    #   - bytes / bytearray / memoryview holding an encoded image file
+    #
+    # and results come back in the same form unless `output` asks for
+    # "array", "image" or "bytes".  Encoded bytes keep their format when
+    # it is lossless and become PNG otherwise.  Carrier modes are those of
+    # CarrierFormat; 16-bit colour has no PIL image form.
+    OUTPUTS = ("array", "image", "bytes")
+
+    def load(image):
+        # (array, image mode, kind, file format) for any supported input
+        if isinstance(image, Image.Image):
+            if image.mode == "P":
+                image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+            array, image_mode, kind, image_format = np.asarray(image), image.mode, "image", None
+        elif isinstance(image, np.ndarray) or memoryview(image).ndim in (2, 3):
+            array, kind, image_format = np.asarray(image), "array", None
+            image_mode = CarrierFormat.array_mode(array)
+        else:
+            source = io.BytesIO(image)
+            with metrics.STAGE_SECONDS.time("load"):
+                with Image.open(source) as img:
+                    image_format = img.format
+                array, image_mode = CarrierFormat.load(source)
+            kind = "bytes"
+        CarrierFormat.channels(image_mode)
+        return array, image_mode, kind, image_format
+
+    def encode(image, message, mode=None, matrix_k=3, roi=None, output=None, image_format=None, inplace=False,
+               depth=1):
+        # Returns the stego image, or None if the message does not fit.
+        # inplace=True embeds straight into a writable array input instead
+        # of a copy.
+        array, image_mode, kind, source_format = MemoryStego.load(image)
+        output = output or kind
+        if output not in MemoryStego.OUTPUTS:
+            raise ValueError("output must be one of " + ", ".join(MemoryStego.OUTPUTS))
+        if not (inplace and kind == "array" and array.flags.writeable):
+            array = array.copy()
+
+        with metrics.errors("encode_memory"), metrics.STAGE_SECONDS.time("encode"):
+            touched = Encoding.embed_pixels(array, message, mode, CarrierFormat.channels(image_mode), matrix_k,
+                                            roi, depth)
+        if touched is None:
+            metrics.CAPACITY_FAILURES.inc()
+            metrics.OPERATIONS.labels("encode_memory", "error").inc()
+            return None
+        metrics.OPERATIONS.labels("encode_memory", "ok").inc()
+        metrics.BYTES_EMBEDDED.inc(len(message))
+        metrics.PIXELS_TOUCHED.inc(touched)
+
+        if output == "array":
+            return array
+        if output == "image":
+            return CarrierFormat.image(array, image_mode)
+        image_format = image_format or source_format
+        if image_format not in Encoding.LOSSLESS_FORMATS:
+            image_format = "PNG"
+        with metrics.STAGE_SECONDS.time("save"):
+            return CarrierFormat.encode(array, image_mode, image_format)
+
+    def decode(image):
+        # The hidden message (str or bytes), or None
+        array, image_mode, kind, source_format = MemoryStego.load(image)
+        with metrics.errors("decode_memory"), metrics.STAGE_SECONDS.time("decode"):
+            message = Decoding.extract_pixels(array, CarrierFormat.channels(image_mode))
+        metrics.OPERATIONS.labels("decode_memory", "empty" if message is None else "ok").inc()
+        if message is not None:
+            metrics.BYTES_EXTRACTED.inc(len(message))
+        return message
@@ -0,0 +1,79 @@
+import numpy as np
+import PIL
+from PIL import Image
+
+from .carrier_format import CarrierFormat
+from .raw_carrier import RawCarrier
+
+
+class PartialReader:
+    # Loads a rectangle of an image without decoding all of it.
+    #
+    # Uncompressed BMP / PPM / TIFF files are sliced straight out of a
+    # memory map, so only the requested rows are read.  Non-interlaced PNGs
+    # are decoded only down to the last requested row (the zlib stream is
+    # sequential, so the rows above are unavoidable).  Anything else falls
+    # back to a full decode and a crop.
+    PILLOW_VERSION = tuple(int(part) for part in PIL.__version__.split(".")[:2] if part.isdigit())
+    # [first, last) Pillow releases with the ImageFile internals used by
+    # decode_rows
+    PILLOW_VERSIONS = ((9, 0), (13, 0))
+
+    def __init__(self, path):
+        self.path = path
+        self.carrier = RawCarrier.open(path)
+        if self.carrier is not None:
+            self.mode = self.carrier.mode
+            self.width, self.height = self.carrier.width, self.carrier.height
+        else:
+            with Image.open(path) as img:
+                self.mode = CarrierFormat.wide_mode(img)
+                self.width, self.height = img.size
+
+    def region(self, left, top, right, bottom):
+        if self.carrier is not None:
+            return np.array(self.carrier.pixels[top:bottom, left:right])
+
+        array = PartialReader.decode_rows(self.path, bottom)
+        if array is None:
+            with Image.open(self.path) as img:
+                array = np.asarray(img)
+        return np.array(array[top:bottom, left:right])
+
+    def decode_rows(path, bottom):
+        # The first `bottom` rows of a non-interlaced PNG, or None when the
+        # file or the installed Pillow does not allow a truncated decode.
+        # This shrinks the private img._size and the tile extents, so it is
+        # limited to the Pillow releases it was checked against, and the
+        # result is checked before use.
+        if not PartialReader.PILLOW_VERSIONS[0] <= PartialReader.PILLOW_VERSION < PartialReader.PILLOW_VERSIONS[1]:
+            return None
+        with Image.open(path) as img:
+            if (img.format != "PNG" or img.info.get("interlace") or len(img.tile) != 1
+                    or not isinstance(getattr(img, "_size", None), tuple)):
+                return None
+            tile = img.tile[0]
+            width, height = img.size
+            if len(tile) != 4 or tuple(tile[1]) != (0, 0, width, height):
+                return None
+            extents = (0, 0, width, bottom)
+            try:
+                if hasattr(tile, "_replace"):
+                    tile = tile._replace(extents=extents)
+                else:
+                    tile = (tile[0], extents) + tuple(tile[2:])
+                img._size = (width, bottom)
+                img.tile = [tile]
+                array = np.asarray(img)
+            except (AttributeError, TypeError, ValueError, OSError):
+                return None
+        if array.shape[:2] != (bottom, width):
+            return None
+        return array
+
+    def rows(self, top, bottom):
+        return self.region(0, top, self.width, bottom)
+
+    def close(self):
+        if self.carrier is not None:
+            self.carrier.close()
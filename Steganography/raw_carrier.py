@@ -0,0 +1,151 @@
+import mmap
+import struct
+
+import numpy as np
+
+
+class RawCarrier:
+    # Memory-mapped pixel access for uncompressed carriers.
+    #
+    # Supported: 24/32-bit BI_RGB BMP (bottom-up or top-down), binary
+    # PPM/PGM with maxval 255, and 8-bit chunky uncompressed TIFF whose
+    # strips are stored back to back.  `pixels` is a zero-copy
+    # (height, width, bands) view in top-down R, G, B(, A) order, whatever
+    # the on-disk layout, so the bit engine sees the same carrier order as
+    # for a PIL-decoded image.  open() returns None for anything else.
+    def __init__(self, path, offset, height, width, bands, stride, bottom_up=False,
+                 bgr=False, mode='RGB', writable=False):
+        self.path = path
+        self.offset = offset
+        self.height = height
+        self.width = width
+        self.stride = stride
+        self.bottom_up = bottom_up
+        self.mode = mode
+        self.writable = writable
+
+        self.file = open(path, "r+b" if writable else "rb")
+        access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+        self.map = mmap.mmap(self.file.fileno(), 0, access=access)
+        raw = np.frombuffer(self.map, dtype=np.uint8, count=height * stride, offset=offset)
+        rows = raw.reshape(height, stride)[:, :width * bands].reshape(height, width, bands)
+        if bottom_up:
+            rows = rows[::-1]
+        if bgr:
+            # BGR(X) on disk; expose R, G, B and drop the padding byte
+            rows = rows[:, :, 2::-1]
+        self.pixels = rows
+
+    def open(path, writable=False):
+        with open(path, "rb") as fo:
+            head = fo.read(4096)
+        try:
+            if head[:2] == b"BM":
+                return RawCarrier.open_bmp(path, head, writable)
+            if head[:2] in (b"P5", b"P6"):
+                return RawCarrier.open_pnm(path, head, writable)
+            if head[:4] in (b"II*\0", b"MM\0*"):
+                return RawCarrier.open_tiff(path, writable)
+        except (struct.error, ValueError, IndexError):
+            return None
+        return None
+
+    def open_bmp(path, head, writable):
+        offset = struct.unpack_from("<I", head, 10)[0]
+        dib_size, width, height, planes, bpp, compression = struct.unpack_from("<IiiHHI", head, 14)
+        if compression != 0 or bpp not in (24, 32) or width <= 0 or height == 0:
+            return None
+        stride = (bpp * width + 31) // 32 * 4
+        return RawCarrier(path, offset, abs(height), width, bpp // 8, stride,
+                          bottom_up=height > 0, bgr=True, writable=writable)
+
+    def open_pnm(path, head, writable):
+        # magic, width, height, maxval separated by whitespace and comments,
+        # then exactly one whitespace byte before the raster
+        tokens = []
+        position = 2
+        while len(tokens) < 3:
+            while head[position:position + 1].isspace():
+                position += 1
+            if head[position:position + 1] == b"#":
+                position = head.index(b"\n", position) + 1
+                continue
+            start = position
+            while not head[position:position + 1].isspace():
+                position += 1
+            tokens.append(int(head[start:position]))
+        width, height, maxval = tokens
+        # PIL scales other maxvals to 0..255 on load, so the raw samples
+        # would not be the ones every other reader embeds into
+        if maxval != 255:
+            return None
+        bands = 3 if head[:2] == b"P6" else 1
+        return RawCarrier(path, position + 1, height, width, bands, width * bands,
+                          mode='RGB' if bands == 3 else 'L', writable=writable)
+
+    def open_tiff(path, writable):
+        with open(path, "rb") as fo:
+            data = fo.read(2)
+            order = "<" if data == b"II" else ">"
+            fo.seek(4)
+            ifd = struct.unpack(order + "I", fo.read(4))[0]
+            fo.seek(ifd)
+            count = struct.unpack(order + "H", fo.read(2))[0]
+            entries = fo.read(count * 12)
+            tags = {}
+            for index in range(count):
+                tag, kind, number, value = struct.unpack_from(order + "HHI4s", entries, index * 12)
+                size = {3: 2, 4: 4}.get(kind)
+                if size is None:
+                    continue
+                code = order + ("H" if size == 2 else "I") * number
+                if size * number <= 4:
+                    values = struct.unpack_from(code, value)
+                else:
+                    fo.seek(struct.unpack(order + "I", value)[0])
+                    values = struct.unpack(code, fo.read(size * number))
+                tags[tag] = values
+
+        # anything without the tags needed here, or in a layout not handled
+        # here, is left to the PIL path
+        required = (256, 257, 258, 262, 273, 279)
+        if any(not tags.get(tag) for tag in required):
+            return None
+        width, height = tags[256][0], tags[257][0]
+        bands = tags.get(277, (1,))[0]
+        compression = tags.get(259, (1,))[0]
+        planar = tags.get(284, (1,))[0]
+        if compression != 1 or planar != 1 or 322 in tags or any(bits != 8 for bits in tags[258]):
+            return None
+        offsets, counts = tags[273], tags[279]
+        if len(offsets) != len(counts):
+            return None
+        for index in range(1, len(offsets)):
+            if offsets[index] != offsets[index - 1] + counts[index - 1]:
+                return None
+        # (bands, PhotometricInterpretation) -> mode; WhiteIsZero, palette,
+        # CMYK and YCbCr samples are not plain intensities
+        modes = {(1, 1): 'L', (3, 2): 'RGB', (4, 2): 'RGBA'}
+        mode = modes.get((bands, tags[262][0]))
+        if mode is None:
+            return None
+        return RawCarrier(path, offsets[0], height, width, bands, width * bands,
+                          mode=mode, writable=writable)
+
+    def flush_rows(self, top, bottom):
+        # msync only the pages holding image rows [top, bottom)
+        if self.bottom_up:
+            top, bottom = self.height - bottom, self.height - top
+        start = self.offset + top * self.stride
+        end = self.offset + bottom * self.stride
+        page_start = start - start % mmap.ALLOCATIONGRANULARITY
+        self.map.flush(page_start, end - page_start)
+
+    def close(self):
+        self.pixels = None
+        try:
+            self.map.close()
+        except BufferError:
+            # a caller still holds a view; the mapping is released with it
+            pass
+        self.file.close()
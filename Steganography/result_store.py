@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import shutil
+import struct
+import tempfile
+import threading
+
+from Monitoring import stego as metrics
+
+
+class ResultStore:
+    # Content-addressed store of finished encodes, so a job that is
+    # submitted again (same cover bytes, payload and settings) is answered
+    # with a copy of the earlier output instead of a full embed.  Entries
+    # live in <root>/<2 hex>/<sha256><ext>; the extension is part of the
+    # key because the output format changes the bytes.  Hits refresh the
+    # entry's mtime and the oldest entries are evicted once the store
+    # grows past max_bytes.
+    KIND = "result"
+    # bump when the embedding of existing settings changes
+    VERSION = 1
+
+    def __init__(self, root, max_bytes=1024 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self.used_bytes = sum(size for _, _, size in self.entries())
+
+    def entries(self):
+        # (mtime, path, size) for every stored output
+        found = []
+        for folder in os.listdir(self.root):
+            directory = os.path.join(self.root, folder)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                found.append((stat.st_mtime_ns, path, stat.st_size))
+        return found
+
+    def job_key(self, src, message, dest, **settings):
+        digest = hashlib.sha256()
+        digest.update(struct.pack("<I", self.VERSION))
+        with open(src, "rb") as fo:
+            for chunk in iter(lambda: fo.read(1 << 20), b""):
+                digest.update(chunk)
+        if isinstance(message, str):
+            payload = b"s" + message.encode("utf-8")
+        else:
+            payload = b"b" + bytes(message)
+        options = json.dumps(settings, sort_keys=True).encode("utf-8")
+        for part in (payload, options):
+            digest.update(struct.pack("<Q", len(part)))
+            digest.update(part)
+        return digest.hexdigest() + os.path.splitext(dest)[1].lower()
+
+    def path_for(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def fetch(self, key, dest):
+        # Copies the stored output to dest; False on a miss
+        path = self.path_for(key)
+        try:
+            shutil.copyfile(path, dest)
+            os.utime(path)
+        except FileNotFoundError:
+            metrics.CACHE_REQUESTS.labels(self.KIND, "miss").inc()
+            return False
+        metrics.CACHE_REQUESTS.labels(self.KIND, "hit").inc()
+        return True
+
+    def put(self, key, output):
+        # Copies a finished output into the store (atomically, so a reader
+        # never sees a partial file) and evicts down to max_bytes
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = os.path.getsize(output)
+        if size > self.max_bytes:
+            return
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(path))
+        os.close(fd)
+        try:
+            shutil.copyfile(output, temp)
+            with self.lock:
+                if os.path.exists(path):
+                    self.used_bytes -= os.path.getsize(path)
+                os.replace(temp, path)
+                self.used_bytes += size
+                self.evict()
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+
+    def evict(self):
+        if self.used_bytes <= self.max_bytes:
+            return
+        for _, path, size in sorted(self.entries()):
+            if self.used_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            self.used_bytes -= size
+            metrics.CACHE_EVICTIONS.labels(self.KIND).inc()
+
+    def clear(self):
+        with self.lock:
+            for _, path, _ in self.entries():
+                os.remove(path)
+            self.used_bytes = 0
@@ -0,0 +1,118 @@
+import math
+import random
+import time
+from statistics import NormalDist
+
+from Monitoring import stego as metrics
+from .tiled_metrics import TiledMetrics
+
+
+class SampledMetrics(TiledMetrics):
+    # Approximate MSE / PSNR / SSIM for interactive previews.
+    #
+    # Instead of every tile, a sample of window x window blocks is measured
+    # (each with its SSIM halo, exactly like a tile) and the per-window
+    # means are averaged.  "stratified" places one window at a random spot
+    # in each cell of a grid over the image, "random" anywhere; windows are
+    # visited in random order so stopping early on the time budget still
+    # leaves a spread-out sample.  The confidence interval is the normal
+    # interval of the window means, with the finite population correction
+    # taken over every window position (windows overlap, so that is the
+    # population they are drawn from).  Windows lie inside the SSIM-valid
+    # area, so the MSE estimate ignores the (win_size - 1) / 2 pixel
+    # border.  When the sample would read as many pixels as the image
+    # itself, the exact compare() result is returned instead.
+    STRATEGIES = ("stratified", "random")
+
+    def __init__(self, window=64, samples=256, strategy="stratified", time_budget=None,
+                 confidence=0.95, seed=None, win_size=7):
+        super().__init__(tile_size=max(window, win_size), workers=1, win_size=win_size)
+        if strategy not in self.STRATEGIES:
+            raise ValueError("strategy must be one of " + ", ".join(self.STRATEGIES))
+        if window < win_size:
+            raise ValueError("window must be at least win_size")
+        self.window = window
+        self.samples = samples
+        self.strategy = strategy
+        self.time_budget = time_budget
+        self.confidence = confidence
+        self.random = random.Random(seed)
+
+    def positions(self, height, width):
+        # top-left corners of the windows, inside the SSIM-valid area
+        pad, window = self.pad, self.window
+        rows = height - 2 * pad - window + 1
+        columns = width - 2 * pad - window + 1
+        if self.strategy == "random":
+            found = [(pad + self.random.randrange(rows), pad + self.random.randrange(columns))
+                     for _ in range(self.samples)]
+        else:
+            grid = max(1, math.isqrt(self.samples))
+            found = []
+            for row in range(grid):
+                for column in range(grid):
+                    r0, r1 = row * rows // grid, max((row + 1) * rows // grid, row * rows // grid + 1)
+                    c0, c1 = column * columns // grid, max((column + 1) * columns // grid, column * columns // grid + 1)
+                    found.append((pad + self.random.randrange(r0, r1), pad + self.random.randrange(c0, c1)))
+        self.random.shuffle(found)
+        return found
+
+    def interval(self, values, population):
+        # (mean, half width) of the confidence interval for the mean
+        n = len(values)
+        mean = math.fsum(values) / n
+        if n < 2:
+            return mean, math.inf
+        variance = math.fsum((value - mean) ** 2 for value in values) / (n - 1)
+        correction = max(0.0, 1 - n / population)
+        z = NormalDist().inv_cdf((1 + self.confidence) / 2)
+        return mean, z * math.sqrt(variance / n * correction)
+
+    def psnr(self, mse, data_range):
+        if mse <= 0:
+            return 100
+        return 20 * math.log10(data_range / math.sqrt(mse))
+
+    def estimate(self, imageA, imageB, order="BGR"):
+        if imageA.shape != imageB.shape:
+            raise ValueError("Images must have the same dimensions")
+        height, width = imageA.shape[:2]
+        rows = height - 2 * self.pad - self.window + 1
+        columns = width - 2 * self.pad - self.window + 1
+        if rows < 1 or columns < 1 or self.samples * self.window * self.window >= height * width:
+            # too small to sample, the exact answer is cheap anyway
+            result = self.compare(imageA, imageB, order)
+            result.update(exact=True, windows=0, interval={name: (value, value) for name, value in result.items()})
+            return result
+
+        started = time.perf_counter()
+        mse_values = []
+        ssim_values = []
+        with metrics.errors("compare_sampled"), metrics.STAGE_SECONDS.time("compare_sampled"):
+            for top, left in self.positions(height, width):
+                box = (top, top + self.window, left, left + self.window)
+                sse, count, ssim_sum, ssim_count = self.measure_tile(imageA, imageB, box, order)
+                mse_values.append(sse / count)
+                ssim_values.append(ssim_sum / ssim_count)
+                if (self.time_budget is not None and len(mse_values) >= 2
+                        and time.perf_counter() - started >= self.time_budget):
+                    break
+
+        population = rows * columns
+        mse, mse_error = self.interval(mse_values, population)
+        ssim, ssim_error = self.interval(ssim_values, population)
+        mse_low, mse_high = max(0.0, mse - mse_error), mse + mse_error
+        data_range = self.data_range(imageA)
+        metrics.OPERATIONS.labels("compare_sampled", "ok").inc()
+        return {
+            "mse": mse,
+            "psnr": self.psnr(mse, data_range),
+            "ssim": ssim,
+            "interval": {
+                "mse": (mse_low, mse_high),
+                "psnr": (self.psnr(mse_high, data_range), self.psnr(mse_low, data_range)),
+                "ssim": (ssim - ssim_error, min(1.0, ssim + ssim_error)),
+            },
+            "windows": len(mse_values),
+            "exact": False,
+        }
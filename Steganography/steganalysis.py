@@ -0,0 +1,162 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from scipy.special import gammaincc
+
+from Monitoring import stego as metrics
+from .cache import image_cache
+
+
+class Steganalysis:
+    # Blind LSB detectors run on the stego image alone, to tell how
+    # visible an output is without the original cover.
+    #
+    # chi_square: Westfeld & Pfitzmann's pairs-of-values test.  LSB
+    # replacement equalises the counts of each value pair (2k, 2k + 1);
+    # the result is the probability that the histogram is that flat.  It
+    # is evaluated on growing prefixes of the image (raster order), since
+    # sequential embedding fills the start of the image first.
+    #
+    # rs: Fridrich's RS analysis.  Groups of 4 horizontal neighbours are
+    # classed as regular / singular by whether flipping the middle two LSBs
+    # (and the shifted "-1" flip) raises or lowers their roughness; the
+    # class counts of the image and of its LSB-inverted copy give the
+    # estimated fraction of pixels carrying payload.
+    #
+    # Both are histogram / whole-array operations; the RS channels run in
+    # parallel (NumPy drops the GIL), which keeps 24 MP well under a second.
+    # 16-bit images are tested on their low byte for chi-square (LSB
+    # replacement equalises the low byte pairs just the same) and scored
+    # directly for RS, whose lookup tables only cover 8-bit neighbours.
+    SEGMENTS = 16
+    # built on first use by rs_tables
+    RS_TABLES = None
+
+    def chi_square(image, segments=SEGMENTS, channels=3):
+        # p-values for the first 1/segments, 2/segments, ... of the image
+        if image.dtype != np.uint8:
+            image = (image & 0xFF).astype(np.uint8)
+        pixels = image.reshape(-1, 1) if image.ndim == 2 else image.reshape(-1, image.shape[-1])
+        bounds = np.linspace(0, pixels.shape[0], segments + 1).astype(np.intp)
+        histograms = np.zeros((segments, 256), dtype=np.int64)
+        for segment in range(segments):
+            # cv2's uint8 histogram is several times faster than bincount
+            block = np.ascontiguousarray(pixels[bounds[segment]:bounds[segment + 1]]).reshape(-1, 1, pixels.shape[1])
+            for band in range(min(channels, pixels.shape[1])):
+                histograms[segment] += cv2.calcHist([block], [band], None, [256], [0, 256]).reshape(-1).astype(np.int64)
+        cumulative = np.cumsum(histograms, axis=0)
+
+        even = cumulative[:, 0::2].astype(np.float64)
+        expected = (even + cumulative[:, 1::2]) / 2
+        valid = expected > 0
+        terms = np.where(valid, (even - expected) ** 2 / np.where(valid, expected, 1), 0)
+        statistic = terms.sum(axis=1)
+        freedom = np.maximum(valid.sum(axis=1) - 1, 1)
+        return gammaincc(freedom / 2, statistic / 2)
+
+    def rs_tables():
+        if Steganalysis.RS_TABLES is None:
+            Steganalysis.RS_TABLES = Steganalysis.build_rs_tables()
+        return Steganalysis.RS_TABLES
+
+    def build_rs_tables():
+        # Roughness change per neighbour pair.  Only the middle two pixels
+        # of a group are flipped, so the change splits into
+        # edge[g0, g1] + middle[g1, g2] + edge[g3, g2], and tabulating the
+        # 256 x 256 pairs turns a group into three lookups.  The four
+        # variants (flip F1 / F-1, image / image with every LSB inverted)
+        # are packed one per byte, biased by 4 so no byte carries, so a
+        # single pass over the groups scores all of them.
+        packed_edge = np.zeros(65536, dtype=np.uint32)
+        packed_middle = np.zeros(65536, dtype=np.uint32)
+        variant = 0
+        for inverted in (False, True):
+            values = np.arange(256, dtype=np.int16) ^ int(inverted)
+            outer, inner = values[:, None], values[None, :]
+            for flip in (values ^ 1, ((values + 1) ^ 1) - 1):
+                edge = np.abs(flip[None, :] - outer) - np.abs(inner - outer)
+                middle = np.abs(flip[None, :] - flip[:, None]) - np.abs(inner - outer)
+                packed_edge |= (edge.ravel() + 4).astype(np.uint32) << (8 * variant)
+                packed_middle |= (middle.ravel() + 4).astype(np.uint32) << (8 * variant)
+                variant += 1
+        return packed_edge, packed_middle
+
+    def rs_counts(groups):
+        # R - S for the mask M and -M, on the image and on its inverse
+        if groups.dtype != np.uint8:
+            return Steganalysis.rs_counts_direct(groups)
+        columns = [groups[:, index].astype(np.uint16) for index in range(4)]
+        edge, middle = Steganalysis.rs_tables()
+        change = edge[(columns[0] << 8) | columns[1]]
+        change += middle[(columns[1] << 8) | columns[2]]
+        change += edge[(columns[3] << 8) | columns[2]]
+
+        # each byte holds change + 12
+        counts = []
+        for variant in range(4):
+            byte = (change >> (8 * variant)).astype(np.uint8)
+            counts.append(int(np.count_nonzero(byte > 12)) - int(np.count_nonzero(byte < 12)))
+        return counts
+
+    def rs_counts_direct(groups):
+        # rs_counts for samples wider than the tables, same variant order
+        counts = []
+        for inverted in (False, True):
+            values = groups.astype(np.int32) ^ int(inverted)
+            roughness = np.abs(np.diff(values, axis=1)).sum(axis=1)
+            for flip in (values ^ 1, ((values + 1) ^ 1) - 1):
+                flipped = values.copy()
+                flipped[:, 1:3] = flip[:, 1:3]
+                change = np.abs(np.diff(flipped, axis=1)).sum(axis=1) - roughness
+                counts.append(int(np.count_nonzero(change > 0)) - int(np.count_nonzero(change < 0)))
+        return counts
+
+    def rs_plane(plane):
+        # estimated embedding rate of one colour plane, in [0, 1]
+        width = plane.shape[1] - plane.shape[1] % 4
+        groups = plane[:, :width].reshape(-1, 4)
+        d0, n0, d1, n1 = Steganalysis.rs_counts(groups)
+
+        a = 2 * (d1 + d0)
+        b = n0 - n1 - d1 - 3 * d0
+        c = d0 - n0
+        if a == 0:
+            if b == 0:
+                return 0.0
+            z = -c / b
+        else:
+            # near full embedding the counts are noisy and the roots can go
+            # complex; their real part is still the estimate
+            discriminant = max(b * b - 4 * a * c, 0)
+            roots = ((-b + discriminant ** 0.5) / (2 * a), (-b - discriminant ** 0.5) / (2 * a))
+            z = min(roots, key=abs)
+        if z == 0.5:
+            return 1.0
+        return float(min(max(z / (z - 0.5), 0.0), 1.0))
+
+    def rs(image, channels=3):
+        planes = [image] if image.ndim == 2 else [image[:, :, band] for band in range(min(channels, image.shape[2]))]
+        with ThreadPoolExecutor(max_workers=len(planes)) as pool:
+            rates = list(pool.map(Steganalysis.rs_plane, planes))
+        return sum(rates) / len(rates)
+
+    def analyze(image, channels=3):
+        # image is an RGB(A) or grayscale uint8 / uint16 array.  score is the larger
+        # of the two detectors, 0 (looks clean) to 1 (clearly embedded).
+        with metrics.STAGE_SECONDS.time("steganalysis"), ThreadPoolExecutor(max_workers=1) as pool:
+            # the histogram test overlaps with the RS planes
+            chi_future = pool.submit(Steganalysis.chi_square, image, channels=channels)
+            rate = Steganalysis.rs(image, channels)
+            curve = chi_future.result()
+        chi = float(curve.max())
+        return {
+            "chi_square": chi,
+            "chi_square_curve": [float(p) for p in curve],
+            "rs": rate,
+            "score": max(chi, rate),
+        }
+
+    def analyze_file(path):
+        array, mode = image_cache.load_image(path)
+        return Steganalysis.analyze(array)
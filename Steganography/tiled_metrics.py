@@ -0,0 +1,192 @@
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from Monitoring import stego as metrics
+from .cache import image_cache
+
+
+class TiledMetrics:
+    # Tile-parallel MSE / PSNR / SSIM.
+    #
+    # Both images are walked in tile_size x tile_size blocks.  Each block is
+    # read together with a halo of (win_size - 1) // 2 pixels so the SSIM
+    # window sees the same neighbourhood it would on the full image, and
+    # only per-tile partial sums are returned to the caller.  Working memory
+    # is therefore bounded by the tile size (times the number of workers),
+    # independent of the image size.  Inputs may be plain arrays or
+    # np.memmap views, in which case only the tiles are ever read.
+    #
+    # MSE and PSNR are exact (integer sums).  SSIM uses the same
+    # uniform window, constants and border crop as skimage's
+    # structural_similarity, so it agrees to floating point tolerance.
+    K1 = 0.01
+    K2 = 0.03
+
+    def __init__(self, tile_size=1024, workers=None, win_size=7):
+        if win_size % 2 == 0:
+            raise ValueError("win_size must be odd")
+        if tile_size < win_size:
+            raise ValueError("tile_size must be at least win_size")
+        self.tile_size = tile_size
+        self.workers = workers or os.cpu_count() or 1
+        self.win_size = win_size
+        self.pad = (win_size - 1) // 2
+
+    def to_gray(self, tile, order):
+        if tile.ndim == 2:
+            return tile
+        if tile.shape[2] < 3:
+            return np.ascontiguousarray(tile[:, :, 0])
+        code = cv2.COLOR_RGB2GRAY if order == "RGB" else cv2.COLOR_BGR2GRAY
+        return cv2.cvtColor(np.ascontiguousarray(tile[:, :, :3]), code)
+
+    def data_range(self, image):
+        # 255 for 8-bit images, 65535 for 16-bit ones
+        return float(np.iinfo(image.dtype).max)
+
+    def ssim_map(self, grayA, grayB, data_range):
+        # cv2.boxFilter releases the GIL, which is what lets the thread pool
+        # scale; the formula mirrors skimage.metrics.structural_similarity.
+        win = (self.win_size, self.win_size)
+        x = grayA.astype(np.float64)
+        y = grayB.astype(np.float64)
+        ux = cv2.boxFilter(x, cv2.CV_64F, win, borderType=cv2.BORDER_REFLECT)
+        uy = cv2.boxFilter(y, cv2.CV_64F, win, borderType=cv2.BORDER_REFLECT)
+        uxx = cv2.boxFilter(x * x, cv2.CV_64F, win, borderType=cv2.BORDER_REFLECT)
+        uyy = cv2.boxFilter(y * y, cv2.CV_64F, win, borderType=cv2.BORDER_REFLECT)
+        uxy = cv2.boxFilter(x * y, cv2.CV_64F, win, borderType=cv2.BORDER_REFLECT)
+
+        points = self.win_size * self.win_size
+        cov_norm = points / (points - 1)
+        vx = cov_norm * (uxx - ux * ux)
+        vy = cov_norm * (uyy - uy * uy)
+        vxy = cov_norm * (uxy - ux * uy)
+
+        c1 = (self.K1 * data_range) ** 2
+        c2 = (self.K2 * data_range) ** 2
+        numerator = (2 * ux * uy + c1) * (2 * vxy + c2)
+        denominator = (ux * ux + uy * uy + c1) * (vx + vy + c2)
+        return numerator / denominator
+
+    def tiles(self, height, width):
+        for top in range(0, height, self.tile_size):
+            for left in range(0, width, self.tile_size):
+                yield top, min(top + self.tile_size, height), left, min(left + self.tile_size, width)
+
+    def measure_tile(self, imageA, imageB, box, order):
+        top, bottom, left, right = box
+        height, width = imageA.shape[:2]
+
+        # squared error over the tile core only, so every pixel counts once
+        coreA = np.asarray(imageA[top:bottom, left:right])
+        coreB = np.asarray(imageB[top:bottom, left:right])
+        diff = coreA.astype(np.int32) - coreB.astype(np.int32)
+        flat = diff.ravel()
+        sse = int(np.dot(flat.astype(np.int64), flat))
+
+        # SSIM is averaged over the globally valid area (border of pad
+        # pixels cropped), evaluated on the core of a haloed tile
+        pad = self.pad
+        r0, r1 = max(top, pad), min(bottom, height - pad)
+        c0, c1 = max(left, pad), min(right, width - pad)
+        if r0 >= r1 or c0 >= c1:
+            return sse, diff.size, 0.0, 0
+
+        h0, h1 = r0 - pad, r1 + pad
+        w0, w1 = c0 - pad, c1 + pad
+        grayA = self.to_gray(np.asarray(imageA[h0:h1, w0:w1]), order)
+        grayB = self.to_gray(np.asarray(imageB[h0:h1, w0:w1]), order)
+        ssim_values = self.ssim_map(grayA, grayB, self.data_range(imageA))[pad:-pad, pad:-pad]
+        return sse, diff.size, math.fsum(ssim_values.sum(axis=1)), ssim_values.size
+
+    def area_weights(self, first, last, source_size, output_size):
+        # (start, stop, weights) such that weights @ values[start:stop]
+        # gives output pixels first..last of an area-averaging resize from
+        # source_size to output_size (output_size <= source_size), the
+        # same average cv2.INTER_AREA takes; edge pixels count by overlap
+        scale = source_size / output_size
+        start = int(first * scale)
+        stop = min(source_size, math.ceil(last * scale))
+        edges = np.arange(first, last + 1) * scale
+        source = np.arange(start, stop)
+        overlap = (np.minimum(edges[1:, None], source[None, :] + 1)
+                   - np.maximum(edges[:-1, None], source[None, :]))
+        return start, stop, np.clip(overlap, 0, None) / scale
+
+    def dissimilarity_map(self, imageA, imageB, size, order="BGR"):
+        # 1 - local SSIM over the whole image (borders reflected, as in
+        # skimage's full=True map), area-averaged down to size = (width,
+        # height), which must not be larger than the images.  Each block
+        # of output pixels is computed from the haloed tile beneath it, so
+        # no full resolution float map is ever built.
+        if imageA.shape != imageB.shape:
+            raise ValueError("Images must have the same dimensions")
+        height, width = imageA.shape[:2]
+        out_width, out_height = size
+        if out_width > width or out_height > height:
+            raise ValueError("size must not be larger than the images")
+        data_range = self.data_range(imageA)
+        result = np.zeros((out_height, out_width), dtype=np.float32)
+        pad = self.pad
+        # output pixels per tile side
+        row_step = max(1, self.tile_size * out_height // height)
+        column_step = max(1, self.tile_size * out_width // width)
+        slots = [(r0, min(r0 + row_step, out_height), c0, min(c0 + column_step, out_width))
+                 for r0 in range(0, out_height, row_step) for c0 in range(0, out_width, column_step)]
+
+        def render(slot):
+            r0, r1, c0, c1 = slot
+            top, bottom, row_weights = self.area_weights(r0, r1, height, out_height)
+            left, right, column_weights = self.area_weights(c0, c1, width, out_width)
+            h0, h1 = max(top - pad, 0), min(bottom + pad, height)
+            w0, w1 = max(left - pad, 0), min(right + pad, width)
+            grayA = self.to_gray(np.asarray(imageA[h0:h1, w0:w1]), order)
+            grayB = self.to_gray(np.asarray(imageB[h0:h1, w0:w1]), order)
+            values = self.ssim_map(grayA, grayB, data_range)[top - h0:bottom - h0, left - w0:right - w0]
+            values = np.clip(1.0 - values, 0.0, 1.0)
+            result[r0:r1, c0:c1] = row_weights @ values @ column_weights.T
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(render, slots))
+        return result
+
+    def compare(self, imageA, imageB, order="BGR"):
+        if imageA.shape != imageB.shape:
+            raise ValueError("Images must have the same dimensions")
+        height, width = imageA.shape[:2]
+        if height < self.win_size or width < self.win_size:
+            raise ValueError("Images are smaller than the SSIM window")
+
+        with metrics.errors("compare"), metrics.STAGE_SECONDS.time("compare"), ThreadPoolExecutor(max_workers=self.workers) as pool:
+            partials = list(pool.map(
+                lambda box: self.measure_tile(imageA, imageB, box, order),
+                self.tiles(height, width),
+            ))
+
+        sse = sum(p[0] for p in partials)
+        count = sum(p[1] for p in partials)
+        ssim_sum = math.fsum(p[2] for p in partials)
+        ssim_count = sum(p[3] for p in partials)
+        metrics.OPERATIONS.labels("compare", "ok").inc()
+
+        mse = sse / count
+        if mse == 0:
+            psnr = 100
+        else:
+            psnr = 20 * math.log10(self.data_range(imageA) / math.sqrt(mse))
+        return {"mse": mse, "psnr": psnr, "ssim": ssim_sum / ssim_count}
+
+    def compare_files(self, pathA, pathB):
+        # Served from the shared image cache; channel order is converted
+        # per tile, so no full size BGR or float copy is ever made.
+        imageA, modeA = image_cache.load_image(pathA)
+        imageB, modeB = image_cache.load_image(pathB)
+        if imageA.ndim == 3:
+            imageA = imageA[:, :, :3]
+        if imageB.ndim == 3:
+            imageB = imageB[:, :, :3]
+        return self.compare(imageA, imageB, order="RGB")
@@ -0,0 +1,54 @@
+# Compare plain LSB ("sequential") with Hamming matrix embedding.
+#
+#   python -m benchmarks.matrix_embedding --megapixels 24 --payload-kb 512
+#
+# Reports LSB changes per payload bit and embedding throughput (payload
+# MB/s, in-memory, no image I/O) for each configuration.
+import argparse
+import time
+
+import numpy as np
+
+from Steganography import Encoding
+
+
+def run(cover, payload, mode, matrix_k=3, repeat=3):
+    best = None
+    for _ in range(repeat):
+        array = cover.copy()
+        start = time.perf_counter()
+        touched = Encoding.embed_pixels(array, payload, mode, matrix_k=matrix_k)
+        elapsed = time.perf_counter() - start
+        if touched is None:
+            return None
+        best = elapsed if best is None else min(best, elapsed)
+    changes = int(np.count_nonzero((array ^ cover) & 1))
+    return changes / (len(payload) * 8), len(payload) / best / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--megapixels", type=float, default=24)
+    parser.add_argument("--payload-kb", type=int, default=512)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    pixels = int(args.megapixels * 1e6)
+    width = int(np.sqrt(pixels * 4 / 3))
+    cover = rng.integers(0, 256, size=(pixels // width, width, 3), dtype=np.uint8)
+    payload = rng.integers(0, 256, size=args.payload_kb * 1024, dtype=np.uint8).tobytes()
+
+    print("%-14s %16s %12s" % ("mode", "changes/bit", "MB/s"))
+    configurations = [("sequential", "sequential", 0)]
+    configurations += [("matrix k=%d" % k, "matrix", k) for k in range(2, 8)]
+    for label, mode, k in configurations:
+        result = run(cover, payload, mode, k or 3)
+        if result is None:
+            print("%-14s %16s" % (label, "does not fit"))
+        else:
+            print("%-14s %16.4f %12.1f" % (label, result[0], result[1]))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,20 @@
+import os
+import sys
 from flet import *
 from GUI.MainPanel import MainPanel
+from Monitoring import MetricsServer
+from JobQueue import HotFolder
 
 if __name__ == "__main__":
-    flet.app(target=MainPanel().main)
+    # e.g. STEGO_METRICS_PORT=9464 exposes http://127.0.0.1:9464/metrics
+    if os.environ.get("STEGO_METRICS_PORT"):
+        MetricsServer(port=int(os.environ["STEGO_METRICS_PORT"])).start()
+    # e.g. STEGO_HOT_FOLDER=/data/inbox STEGO_DONE_DIR=/data/done runs the
+    # headless ingestion loop instead of the GUI; messages are encrypted
+    # with AES-GCM as on the Encryption screen
+    if os.environ.get("STEGO_HOT_FOLDER"):
+        if not os.environ.get("STEGO_DONE_DIR"):
+            sys.exit("STEGO_DONE_DIR must name the folder encoded images are written to")
+        HotFolder(os.environ["STEGO_HOT_FOLDER"], os.environ["STEGO_DONE_DIR"]).run()
+    else:
+        flet.app(target=MainPanel().main)
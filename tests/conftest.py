@@ -0,0 +1,19 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# the packages are imported from the repository root, as main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def cover():
+    # smooth RGB gradient with some noise, so the adaptive cost map has
+    # both flat and textured areas to choose from
+    rng = np.random.default_rng(7)
+    rows, columns = np.mgrid[0:96, 0:128]
+    base = np.stack([rows * 2, columns * 2, (rows + columns)], axis=-1)
+    noise = rng.integers(0, 24, base.shape)
+    return (base + noise).clip(0, 255).astype(np.uint8)
@@ -0,0 +1,108 @@
+import os
+
+import pytest
+
+from JobQueue import BatchRunner, Job, JobJournal
+
+
+class Writer:
+    # handler for "write" jobs: writes text to dest and counts its calls,
+    # failing the first `failures` of them
+    def __init__(self, failures=0):
+        self.calls = []
+        self.failures = failures
+
+    def __call__(self, dest, text):
+        self.calls.append(dest)
+        if len(self.calls) <= self.failures:
+            raise OSError("disk went away")
+        with open(dest, "w", encoding="utf-8") as fo:
+            fo.write(text)
+
+
+def complete(dest, text):
+    with open(dest, encoding="utf-8") as fo:
+        return fo.read() == text
+
+
+def runner(path, handler, max_attempts=3):
+    return BatchRunner(JobJournal(path), handlers={"write": handler}, verifiers={"write": complete},
+                       max_attempts=max_attempts)
+
+
+@pytest.fixture
+def jobs(tmp_path):
+    return [Job("write", {"dest": str(tmp_path / ("out%d.txt" % index)), "text": "job %d" % index})
+            for index in range(4)]
+
+
+def test_rerun_skips_done_jobs(tmp_path, jobs):
+    journal = str(tmp_path / "journal.jsonl")
+    first = Writer()
+    assert runner(journal, first).run(jobs) == {"done": 4, "skipped": 0, "failed": 0}
+    second = Writer()
+    assert runner(journal, second).run(jobs) == {"done": 0, "skipped": 4, "failed": 0}
+    assert second.calls == []
+
+
+def test_changed_output_runs_again(tmp_path, jobs):
+    journal = str(tmp_path / "journal.jsonl")
+    runner(journal, Writer()).run(jobs)
+    os.remove(jobs[2].params["dest"])
+    second = Writer()
+    assert runner(journal, second).run(jobs) == {"done": 1, "skipped": 3, "failed": 0}
+    assert second.calls == [jobs[2].params["dest"]]
+
+
+def test_interrupted_job_with_complete_output_is_kept(tmp_path, jobs):
+    journal = JobJournal(str(tmp_path / "journal.jsonl"))
+    Writer()(**jobs[0].params)
+    journal.record(BatchRunner.job_key(jobs[0]), JobJournal.STARTED, 1)
+    journal.close()
+    writer = Writer()
+    assert runner(journal.path, writer).run(jobs[:1]) == {"done": 0, "skipped": 1, "failed": 0}
+    assert writer.calls == []
+
+
+def test_interrupted_job_with_partial_output_runs_again(tmp_path, jobs):
+    journal = JobJournal(str(tmp_path / "journal.jsonl"))
+    with open(jobs[0].params["dest"], "w", encoding="utf-8") as fo:
+        fo.write("jo")
+    journal.record(BatchRunner.job_key(jobs[0]), JobJournal.STARTED, 1)
+    journal.close()
+    writer = Writer()
+    assert runner(journal.path, writer).run(jobs[:1]) == {"done": 1, "skipped": 0, "failed": 0}
+    assert complete(**jobs[0].params)
+    assert JobJournal(journal.path).get(BatchRunner.job_key(jobs[0]))["attempts"] == 2
+
+
+def test_crash_on_the_last_attempt_fails(tmp_path, jobs):
+    journal = JobJournal(str(tmp_path / "journal.jsonl"))
+    journal.record(BatchRunner.job_key(jobs[0]), JobJournal.STARTED, 3)
+    journal.close()
+    writer = Writer()
+    assert runner(journal.path, writer).run(jobs[:1]) == {"done": 0, "skipped": 0, "failed": 1}
+    assert writer.calls == []
+
+
+def test_failures_are_retried(tmp_path, jobs):
+    writer = Writer(failures=2)
+    assert runner(str(tmp_path / "journal.jsonl"), writer).run(jobs[:1]) == {"done": 1, "skipped": 0, "failed": 0}
+    assert len(writer.calls) == 3
+
+    always = Writer(failures=99)
+    assert runner(str(tmp_path / "other.jsonl"), always).run(jobs[1:2]) == {"done": 0, "skipped": 0, "failed": 1}
+    assert len(always.calls) == 3
+
+
+def test_torn_journal_line_is_dropped(tmp_path, jobs):
+    path = str(tmp_path / "journal.jsonl")
+    runner(path, Writer()).run(jobs)
+    with open(path, "a", encoding="utf-8") as fo:
+        fo.write('{"id": "torn", "sta')
+    journal = JobJournal(path)
+    assert journal.get("torn") is None
+    assert journal.get(BatchRunner.job_key(jobs[0]))["state"] == JobJournal.DONE
+    journal.record("next", JobJournal.DONE)
+    journal.close()
+    assert JobJournal(path).get("next")["state"] == JobJournal.DONE
@@ -0,0 +1,65 @@
+import io
+
+import numpy as np
+import pytest
+
+from Steganography import CarrierFormat, Decoding, Encoding, MemoryStego, Steganalysis, TiledMetrics
+
+
+def wide(cover):
+    return cover.astype(np.uint16) * 257
+
+
+@pytest.mark.parametrize("bands", [1, 3, 4])
+def test_16_bit_save_load(cover, tmp_path, bands):
+    array = np.dstack([wide(cover), wide(cover)[:, :, :1]])[:, :, :bands]
+    if bands == 1:
+        array = np.ascontiguousarray(array[:, :, 0])
+    mode = CarrierFormat.array_mode(array)
+    path = str(tmp_path / "wide.png")
+    CarrierFormat.save(array, mode, path)
+    loaded, loaded_mode = CarrierFormat.load(path)
+    assert loaded.dtype == np.uint16
+    assert CarrierFormat.channels(loaded_mode) == CarrierFormat.channels(mode)
+    np.testing.assert_array_equal(loaded, array)
+
+
+@pytest.mark.parametrize("depth", [1, 4, 8])
+def test_16_bit_depth_round_trip(cover, depth):
+    array = wide(cover)
+    payload = bytes(range(256)) * 8
+    stego = MemoryStego.encode(array, payload, mode="sequential", depth=depth)
+    assert stego.dtype == np.uint16
+    assert MemoryStego.decode(stego) == payload
+    assert np.abs(stego.astype(int) - array).max() < 1 << depth
+
+
+def test_depth_limited_to_half_the_sample(cover):
+    with pytest.raises(ValueError):
+        Encoding.embed_pixels(cover.copy(), b"x", mode="sequential", depth=5)
+    with pytest.raises(ValueError):
+        Encoding.embed_pixels(cover.copy(), b"x", mode="matrix", depth=2)
+
+
+def test_grayscale_round_trip(cover, tmp_path):
+    gray = np.ascontiguousarray(cover[:, :, 0])
+    data = MemoryStego.encode(gray, "gray text", mode="adaptive", output="bytes", image_format="PNG")
+    assert MemoryStego.decode(data) == "gray text"
+    array, mode = CarrierFormat.load(io.BytesIO(data))
+    assert mode == "L"
+    assert Decoding.extract_pixels(array, CarrierFormat.channels(mode)) == "gray text"
+
+
+def test_16_bit_analysis_matches_low_byte(cover):
+    array = wide(cover)
+    stego = MemoryStego.encode(array, np.random.default_rng(3).bytes(2000), mode="sequential")
+    low = (stego & 0xFF).astype(np.uint8)
+    assert Steganalysis.chi_square(stego).tolist() == Steganalysis.chi_square(low).tolist()
+    assert 0.0 <= Steganalysis.analyze(stego)["rs"] <= 1.0
+
+
+def test_16_bit_psnr_uses_full_range(cover):
+    narrow = TiledMetrics(tile_size=32).compare(cover, cover ^ 1)
+    broad = TiledMetrics(tile_size=32).compare(wide(cover), wide(cover) ^ 1)
+    assert narrow["mse"] == broad["mse"] == 1
+    assert broad["psnr"] == pytest.approx(narrow["psnr"] + 20 * np.log10(257))
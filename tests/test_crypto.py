@@ -0,0 +1,84 @@
+import pytest
+
+from Cryptography import Decrypter, Encrypter, MODE_CBC, MODE_GCM, MODE_GCM_SEGMENTED
+
+
+@pytest.mark.parametrize("message", [b"", b"short", bytes(range(256)) * 100])
+def test_gcm_round_trip(message):
+    ciphertext = Encrypter("", mode=MODE_GCM).encrypt(message)
+    assert Decrypter("").decrypt(ciphertext) == message
+
+
+def test_gcm_uses_fresh_nonces():
+    encrypter = Encrypter("", mode=MODE_GCM)
+    assert encrypter.encrypt(b"same") != encrypter.encrypt(b"same")
+
+
+# nonce, ciphertext and tag bytes
+@pytest.mark.parametrize("position", [5, 16, -20, -1])
+def test_gcm_detects_tampering(position):
+    ciphertext = bytearray(Encrypter("", mode=MODE_GCM).encrypt(b"authenticated message"))
+    ciphertext[position] ^= 0x01
+    with pytest.raises(ValueError):
+        Decrypter("").decrypt(bytes(ciphertext))
+
+
+def test_gcm_detects_truncation():
+    ciphertext = Encrypter("", mode=MODE_GCM).encrypt(b"authenticated message")
+    with pytest.raises(ValueError):
+        Decrypter("").decrypt(ciphertext[:-1])
+
+
+def test_cbc_round_trip():
+    ciphertext = Encrypter("", mode=MODE_CBC).encrypt(b"legacy payload")
+    assert Decrypter("").decrypt(ciphertext) == b"legacy payload"
+
+
+def segmented(segment_size=1024):
+    return Encrypter("", mode=MODE_GCM_SEGMENTED, workers=4, segment_size=segment_size)
+
+
+@pytest.mark.parametrize("size", [0, 1, 1023, 1024, 1025, 10 * 1024 + 7])
+def test_segmented_round_trip(size):
+    message = bytes(index % 251 for index in range(size))
+    assert Decrypter("", workers=4).decrypt(segmented().encrypt(message)) == message
+
+
+def test_large_gcm_payload_is_segmented():
+    encrypter = Encrypter("", mode=MODE_GCM, segment_size=1024)
+    message = bytes(5000)
+    ciphertext = encrypter.encrypt(message)
+    assert ciphertext[4] == Encrypter("", mode=MODE_GCM_SEGMENTED).encrypt(b"")[4]
+    assert Decrypter("").decrypt(ciphertext) == message
+
+
+@pytest.mark.parametrize("change", ["swap", "drop", "flip"])
+def test_segmented_detects_tampering(change):
+    ciphertext = segmented().encrypt(bytes(4096))
+    prefix = len(ciphertext) - 4 * (1024 + 16)
+    segments = [ciphertext[prefix + index * 1040:prefix + (index + 1) * 1040] for index in range(4)]
+    if change == "swap":
+        segments[1], segments[2] = segments[2], segments[1]
+    elif change == "drop":
+        del segments[3]
+    else:
+        segments[0] = bytes([segments[0][0] ^ 1]) + segments[0][1:]
+    with pytest.raises(ValueError):
+        Decrypter("").decrypt(ciphertext[:prefix] + b"".join(segments))
+
+
+@pytest.mark.parametrize("chunk", [1, 100, 1024, 5000])
+def test_stream_round_trip(chunk):
+    message = bytes(index % 253 for index in range(3 * 1024 + 500))
+    chunks = [message[offset:offset + chunk] for offset in range(0, len(message), chunk)]
+    ciphertext = b"".join(segmented().encrypt_stream(chunks))
+    assert Decrypter("").decrypt(ciphertext) == message
+    pieces = [ciphertext[offset:offset + chunk] for offset in range(0, len(ciphertext), chunk)]
+    assert b"".join(Decrypter("").decrypt_stream(pieces)) == message
+
+
+def test_stream_detects_truncation():
+    # three full segments; without the last one the new last is not flagged
+    ciphertext = b"".join(segmented().encrypt_stream([bytes(3072)]))
+    with pytest.raises(ValueError):
+        b"".join(Decrypter("").decrypt_stream([ciphertext[:-1040]]))
@@ -0,0 +1,30 @@
+import cv2
+import numpy as np
+import pytest
+from skimage.metrics import structural_similarity
+
+from Steganography import DifferenceStego, TiledMetrics
+
+
+@pytest.fixture
+def pair(cover):
+    stego = cover.copy()
+    stego[20:60] ^= 1
+    return cover, stego
+
+
+@pytest.mark.parametrize("tile_size", [7, 16, 50, 1024])
+@pytest.mark.parametrize("size", [(128, 96), (50, 37), (17, 29)])
+def test_tiled_ssim_heatmap_matches_full_map(pair, tile_size, size):
+    grayA, grayB = (cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) for image in pair)
+    score, full = structural_similarity(grayA, grayB, full=True)
+    expected = cv2.resize(np.clip(1 - full, 0, 1).astype(np.float32), size, interpolation=cv2.INTER_AREA)
+    result = TiledMetrics(tile_size=tile_size).dissimilarity_map(*pair, size)
+    np.testing.assert_allclose(result, expected, atol=1e-6)
+
+
+@pytest.mark.parametrize("kind", ["lsb", "ssim"])
+def test_heatmap_is_preview_sized(pair, kind):
+    png = DifferenceStego.calculateHeatmap(*pair, kind=kind, max_size=(64, 64))
+    image = cv2.imdecode(np.frombuffer(png, dtype=np.uint8), cv2.IMREAD_COLOR)
+    assert image.shape[:2] == (48, 64)
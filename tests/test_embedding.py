@@ -0,0 +1,127 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from Steganography import Decoding, Encoding, StegoHeader, image_cache
+
+
+def round_trip(cover, message, **options):
+    array = cover.copy()
+    touched = Encoding.embed_pixels(array, message, **options)
+    assert touched is not None
+    return array, Decoding.extract_pixels(array)
+
+
+def test_header_pack_unpack():
+    header = StegoHeader.for_payload(StegoHeader.MODE_MATRIX, b"payload", StegoHeader.FLAG_TEXT, 4)
+    unpacked = StegoHeader.unpack(header.pack())
+    assert (unpacked.mode, unpacked.length, unpacked.crc, unpacked.flags, unpacked.param) == (
+        header.mode, header.length, header.crc, header.flags, header.param)
+    assert unpacked.check(b"payload")
+    assert not unpacked.check(b"pay1oad")
+
+
+def test_header_rejects_foreign_data():
+    assert StegoHeader.unpack(b"\0" * StegoHeader.SIZE) is None
+    assert StegoHeader.unpack(StegoHeader.MAGIC) is None
+
+
+def test_legacy_round_trip(cover):
+    array, message = round_trip(cover, "legacy text")
+    assert message == "legacy text"
+    assert np.abs(array.astype(int) - cover).max() <= 1
+
+
+@pytest.mark.parametrize("mode", ["sequential", "adaptive"])
+def test_framed_text_round_trip(cover, mode):
+    array, message = round_trip(cover, "héllo wörld " * 20, mode=mode)
+    assert message == "héllo wörld " * 20
+    assert np.abs(array.astype(int) - cover).max() <= 1
+
+
+@pytest.mark.parametrize("mode", ["sequential", "adaptive"])
+def test_framed_bytes_round_trip(cover, mode):
+    payload = bytes(range(256)) * 4
+    array, message = round_trip(cover, payload, mode=mode)
+    assert message == payload
+
+
+def test_corrupted_payload_fails_crc(cover):
+    array = cover.copy()
+    Encoding.embed_pixels(array, b"\xff" * 64, mode="sequential")
+    pixels = array.reshape(-1, 3)
+    pixels[StegoHeader.BITS // 3 + 10] ^= 1
+    assert Decoding.extract_pixels(array) is None
+
+
+def test_message_too_large(cover):
+    assert Encoding.embed_pixels(cover.copy(), b"x" * cover.size, mode="sequential") is None
+
+
+def test_file_round_trip(cover, tmp_path):
+    src = str(tmp_path / "cover.png")
+    dest = str(tmp_path / "stego.png")
+    Image.fromarray(cover).save(src)
+    assert Encoding.encode(src, "saved message", dest, mode="sequential")
+    image_cache.invalidate(dest)
+    assert Decoding.extract(dest) == "saved message"
+
+
+@pytest.mark.parametrize("k", [1, 3, 8])
+def test_matrix_round_trip(cover, k):
+    payload = bytes(range(64))
+    array, message = round_trip(cover, payload, mode="matrix", matrix_k=k)
+    assert message == payload
+
+
+def test_matrix_changes_fewer_samples(cover):
+    payload = np.random.default_rng(1).bytes(600)
+    sequential = cover.copy()
+    matrix = cover.copy()
+    Encoding.embed_pixels(sequential, payload, mode="sequential")
+    Encoding.embed_pixels(matrix, payload, mode="matrix", matrix_k=3)
+    assert np.count_nonzero(matrix != cover) < np.count_nonzero(sequential != cover)
+
+
+def test_matrix_k_out_of_range(cover):
+    with pytest.raises(ValueError):
+        Encoding.embed_pixels(cover.copy(), b"x", mode="matrix", matrix_k=9)
+
+
+@pytest.mark.parametrize("mode", ["sequential", "adaptive", "matrix"])
+def test_roi_round_trip(cover, mode):
+    roi = (40, 30, 48, 40)
+    array, message = round_trip(cover, b"inside the box" * 4, mode=mode, roi=roi)
+    assert message == b"inside the box" * 4
+    # apart from the header at the start, nothing outside the ROI moved
+    changed = np.argwhere((array != cover).any(axis=2))
+    header_rows = -(-(StegoHeader.BITS + StegoHeader.ROI_BITS) // 3 // cover.shape[1])
+    outside = changed[(changed[:, 0] >= header_rows)]
+    left, top, width, height = roi
+    assert ((outside[:, 1] >= left) & (outside[:, 1] < left + width)
+            & (outside[:, 0] >= top) & (outside[:, 0] < top + height)).all()
+
+
+def test_roi_overlapping_header(cover):
+    with pytest.raises(ValueError):
+        Encoding.embed_pixels(cover.copy(), b"x", mode="sequential", roi=(0, 0, 16, 16))
+
+
+def test_roi_outside_image(cover):
+    with pytest.raises(ValueError):
+        Encoding.embed_pixels(cover.copy(), b"x", mode="sequential", roi=(100, 50, 64, 64))
+
+
+@pytest.mark.parametrize("options", [{"mode": "sequential"}, {"mode": "matrix", "matrix_k": 2},
+                                     {"mode": "adaptive", "roi": (16, 20, 64, 64)}])
+def test_partial_read(cover, tmp_path, options):
+    array = cover.copy()
+    assert Encoding.embed_pixels(array, "read me partially", **options) is not None
+    path = str(tmp_path / "stego.png")
+    Image.fromarray(array).save(path)
+    assert Decoding.extract_partial(path) == "read me partially"
+
+
+def test_legacy_format_rejects_bytes(cover):
+    with pytest.raises(ValueError):
+        Encoding.embed_pixels(cover.copy(), b"binary")
@@ -0,0 +1,51 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from Cryptography import Decrypter, Encrypter, MODE_GCM_SEGMENTED
+from Steganography import Encoding, FilePayload, image_cache
+
+
+@pytest.fixture
+def cover_path(cover, tmp_path):
+    path = str(tmp_path / "cover.png")
+    Image.fromarray(cover).save(path)
+    return path
+
+
+@pytest.fixture
+def payload_path(tmp_path):
+    path = str(tmp_path / "report.bin")
+    with open(path, "wb") as fo:
+        fo.write(np.random.default_rng(5).bytes(2000) + bytes(3000))
+    return path
+
+
+@pytest.mark.parametrize("encrypted", [False, True])
+def test_file_round_trip(cover_path, payload_path, tmp_path, encrypted):
+    dest = str(tmp_path / "stego.png")
+    encrypter = Encrypter("", mode=MODE_GCM_SEGMENTED, segment_size=512) if encrypted else None
+    assert FilePayload.encode(cover_path, payload_path, dest, encrypter, chunk_size=700)
+    image_cache.invalidate(dest)
+    out_dir = str(tmp_path / "out")
+    path = FilePayload.decode(dest, out_dir, Decrypter("") if encrypted else None, chunk_size=700)
+    assert path == os.path.join(out_dir, "report.bin")
+    with open(path, "rb") as fo, open(payload_path, "rb") as original:
+        assert fo.read() == original.read()
+    assert os.listdir(out_dir) == ["report.bin"]
+
+
+def test_file_too_large(cover_path, tmp_path):
+    payload = str(tmp_path / "noise.bin")
+    with open(payload, "wb") as fo:
+        fo.write(np.random.default_rng(6).bytes(10000))
+    assert not FilePayload.encode(cover_path, payload, str(tmp_path / "stego.png"))
+
+
+def test_text_payload_is_not_a_file(cover_path, tmp_path):
+    dest = str(tmp_path / "stego.png")
+    assert Encoding.encode(cover_path, "just text", dest, mode="sequential")
+    image_cache.invalidate(dest)
+    assert FilePayload.decode(dest, str(tmp_path / "out")) is None
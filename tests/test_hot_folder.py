@@ -0,0 +1,160 @@
+import base64
+import json
+import os
+import shutil
+
+import pytest
+from PIL import Image
+
+from Cryptography import Decrypter
+from JobQueue import EncodePipeline, HotFolder
+from Steganography import Decoding
+
+
+class CopyPipeline:
+    # stands in for EncodePipeline: "encodes" by copying the cover
+    def __init__(self):
+        self.batches = []
+
+    def run(self, items):
+        self.batches.append(items)
+        for src, message, dest in items:
+            shutil.copy(src, dest)
+        return [True] * len(items)
+
+
+@pytest.fixture
+def inbox(tmp_path):
+    path = tmp_path / "inbox"
+    path.mkdir()
+    return path
+
+
+def folder(inbox, tmp_path, pipeline=None, **options):
+    options.setdefault("settle", 2.0)
+    options.setdefault("batch_wait", 1.0)
+    return HotFolder(str(inbox), str(tmp_path / "done"), pipeline or CopyPipeline(), **options)
+
+
+def drop(inbox, name, cover="cover.png", **manifest):
+    if not (inbox / cover).exists():
+        (inbox / cover).write_bytes(b"cover")
+    (inbox / name).write_text(json.dumps(dict(manifest, cover=cover)), encoding="utf-8")
+
+
+def test_waits_for_files_to_settle(inbox, tmp_path):
+    hot = folder(inbox, tmp_path)
+    drop(inbox, "a.json", message="hi")
+    assert hot.poll(now=0) == 0
+    assert hot.poll(now=1.5) == 0
+    # still being written: the clock starts again
+    (inbox / "cover.png").write_bytes(b"cover, now complete")
+    assert hot.poll(now=2.5) == 0
+    assert hot.poll(now=4.0) == 0
+    # settled at 4.5, then waits batch_wait for company
+    assert hot.poll(now=4.6) == 0
+    assert hot.poll(now=5.6) == 1
+    assert sorted(os.listdir(hot.done_dir)) == [".work", "cover.png"]
+    assert os.listdir(str(inbox)) == ["failed"]
+
+
+def test_partial_files_are_ignored(inbox, tmp_path):
+    hot = folder(inbox, tmp_path, settle=0, batch_wait=0)
+    drop(inbox, "a.json", cover="cover.png.part", message="hi")
+    assert hot.poll(now=0) == 0
+    assert hot.poll(now=10) == 0
+    assert "a.json" not in os.listdir(hot.failed_dir)
+
+
+def test_full_batch_does_not_wait(inbox, tmp_path):
+    pipeline = CopyPipeline()
+    hot = folder(inbox, tmp_path, pipeline, settle=0, batch_size=3, batch_wait=60)
+    for index in range(7):
+        drop(inbox, "%d.json" % index, cover="%d.png" % index, message="hi")
+    assert hot.poll(now=0) == 6
+    assert [len(batch) for batch in pipeline.batches] == [3, 3]
+    assert hot.poll(now=60) == 1
+
+
+def test_shared_cover_stays_until_last_job(inbox, tmp_path):
+    hot = folder(inbox, tmp_path, settle=0, batch_size=1, batch_wait=0)
+    drop(inbox, "a.json", message="one", output="one.png")
+    drop(inbox, "b.json", message="two", output="two.png")
+    assert hot.poll(now=0) == 2
+    assert sorted(os.listdir(hot.done_dir)) == [".work", "one.png", "two.png"]
+    assert os.listdir(str(inbox)) == ["failed"]
+
+
+def test_output_collisions_fail_the_later_job(inbox, tmp_path):
+    hot = folder(inbox, tmp_path, settle=0, batch_wait=0)
+    drop(inbox, "a.json", message="one", output="same.png")
+    drop(inbox, "b.json", message="two", output="same.png")
+    assert hot.poll(now=0) == 1
+    assert sorted(os.listdir(hot.failed_dir)) == ["b.json", "b.json.error"]
+
+    drop(inbox, "c.json", cover="other.png", message="three", output="same.png")
+    assert hot.poll(now=1) == 0
+    assert "c.json.error" in os.listdir(hot.failed_dir)
+    assert (tmp_path / "done" / "same.png").read_bytes() == b"cover"
+
+
+def test_bad_manifest_fails(inbox, tmp_path):
+    hot = folder(inbox, tmp_path, settle=0, batch_wait=0)
+    (inbox / "bad.json").write_text("{not json", encoding="utf-8")
+    drop(inbox, "escape.json", cover="../cover.png", message="hi")
+    hot.poll(now=0)
+    assert {"bad.json.error", "escape.json.error"} <= set(os.listdir(hot.failed_dir))
+
+
+def test_run_survives_failed_polls(inbox, tmp_path, monkeypatch):
+    hot = folder(inbox, tmp_path, settle=0, batch_wait=0, poll_interval=0)
+    polls = []
+    original = hot.poll
+
+    def poll(now=None):
+        polls.append(now)
+        if len(polls) == 3:
+            hot.stop()
+        if len(polls) < 3:
+            raise OSError("share unreachable")
+        return original(now)
+
+    monkeypatch.setattr(hot, "poll", poll)
+    drop(inbox, "a.json", message="hi")
+    hot.run()
+    assert len(polls) == 3
+    assert "cover.png" in os.listdir(hot.done_dir)
+
+
+def test_encodes_with_the_pipeline(inbox, tmp_path, cover):
+    Image.fromarray(cover).save(str(inbox / "scan.png"))
+    (inbox / "payload.bin").write_bytes(bytes(range(256)))
+    drop(inbox, "text.json", cover="scan.png", message="hidden text", output="text.png")
+    drop(inbox, "file.json", cover="scan.png", payload="payload.bin", output="file.png")
+    hot = folder(inbox, tmp_path, EncodePipeline(mode="sequential"), settle=0, batch_wait=0)
+    assert hot.poll(now=0) == 2
+    assert Decoding.extract(str(tmp_path / "done" / "text.png")) == "hidden text"
+    assert Decoding.extract(str(tmp_path / "done" / "file.png")) == bytes(range(256))
+
+
+def test_default_pipeline_encrypts(inbox, tmp_path, cover):
+    Image.fromarray(cover).save(str(inbox / "scan.png"))
+    (inbox / "payload.bin").write_bytes(bytes(range(256)))
+    drop(inbox, "text.json", cover="scan.png", message="hidden text", output="text.png")
+    drop(inbox, "file.json", cover="scan.png", payload="payload.bin", output="file.png")
+    hot = HotFolder(str(inbox), str(tmp_path / "done"), settle=0, batch_wait=0)
+    assert hot.poll(now=0) == 2
+    # read back the way the Decryption screen does
+    text = Decoding.decode(str(tmp_path / "done" / "text.png"))
+    assert Decrypter("").decrypt(base64.b64decode(text)) == b"hidden text"
+    binary = Decoding.extract(str(tmp_path / "done" / "file.png"))
+    assert Decrypter("").decrypt(binary) == bytes(range(256))
+
+
+def test_legacy_pipeline_rejects_binary_payloads(inbox, tmp_path, cover):
+    Image.fromarray(cover).save(str(inbox / "scan.png"))
+    (inbox / "payload.bin").write_bytes(b"binary")
+    drop(inbox, "file.json", cover="scan.png", payload="payload.bin")
+    hot = folder(inbox, tmp_path, EncodePipeline(), settle=0, batch_wait=0)
+    assert hot.poll(now=0) == 0
+    assert "framed mode" in (inbox / "failed" / "file.json.error").read_text(encoding="utf-8")
@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+from Cryptography import KeyGeneration, KeyStore
+
+
+@pytest.fixture(autouse=True)
+def fast_store(monkeypatch):
+    # a cheap KDF and a small table so a test can push it past MAX_LOAD
+    monkeypatch.setattr(KeyStore, "ITERATIONS", 10)
+    monkeypatch.setattr(KeyStore, "INITIAL_SLOTS", 8)
+
+
+def test_add_and_verify(tmp_path):
+    store = KeyStore(str(tmp_path / "keystore.db"))
+    store.add("alpha", "secret")
+    assert store.contains("alpha")
+    assert store.verify("alpha", "secret")
+    assert not store.verify("alpha", "Secret")
+    assert not store.verify("beta", "secret")
+    assert len(store) == 1
+
+
+def test_grow_keeps_every_key(tmp_path):
+    path = str(tmp_path / "keystore.db")
+    store = KeyStore(path)
+    for index in range(30):
+        store.add("key%d" % index, "value%d" % index)
+    assert store.slot_count >= 30 / KeyStore.MAX_LOAD
+    assert len(store) == 30
+    assert all(store.verify("key%d" % index, "value%d" % index) for index in range(30))
+    assert not os.path.exists(path + ".tmp")
+
+    store.close()
+    reopened = KeyStore(path)
+    assert len(reopened) == 30
+    assert all(reopened.verify("key%d" % index, "value%d" % index) for index in range(30))
+    assert not reopened.verify("key3", "value4")
+
+
+def test_replacing_a_key(tmp_path):
+    store = KeyStore(str(tmp_path / "keystore.db"))
+    store.add("alpha", "old")
+    store.add("alpha", "new")
+    assert len(store) == 1
+    assert store.verify("alpha", "new")
+    assert not store.verify("alpha", "old")
+
+
+def test_legacy_key_file_is_migrated(tmp_path):
+    keyfile = str(tmp_path / "legacy")
+    KeyGeneration.createplaintextfile(keyfile, "old secret")
+    assert KeyGeneration.checkforfileexist(keyfile)
+    assert not KeyGeneration.verifykey(keyfile, "wrong")
+    assert KeyGeneration.verifykey(keyfile, "old secret")
+    assert KeyGeneration.keystore(keyfile).contains("legacy")
+    os.remove(keyfile + ".txt.enc")
+    assert KeyGeneration.verifykey(keyfile, "old secret")
+
+
+def test_new_keys_live_in_the_store(tmp_path):
+    keyfile = str(tmp_path / "fresh")
+    assert not KeyGeneration.checkforfileexist(keyfile)
+    KeyGeneration.createkeyfile(keyfile, "value")
+    assert KeyGeneration.checkforfileexist(keyfile)
+    assert KeyGeneration.verifykey(keyfile, "value")
+    assert os.listdir(str(tmp_path)) == ["keystore.db"]
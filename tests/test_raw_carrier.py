@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from Steganography import Decoding, Encoding, RawCarrier, image_cache
+
+
+def write_pnm(path, array, maxval=255):
+    magic = b"P6" if array.ndim == 3 else b"P5"
+    height, width = array.shape[:2]
+    with open(path, "wb") as fo:
+        fo.write(b"%s\n# comment\n%d %d\n%d\n" % (magic, width, height, maxval))
+        fo.write(array.tobytes())
+
+
+@pytest.mark.parametrize("gray", [False, True])
+def test_inplace_matches_full_decode(cover, tmp_path, gray):
+    path = str(tmp_path / "carrier.pnm")
+    write_pnm(path, np.ascontiguousarray(cover[:, :, 0]) if gray else cover)
+    assert Encoding.encode_inplace(path, "mapped", mode="sequential")
+    image_cache.invalidate(path)
+    array, mode = image_cache.load_image(path)
+    assert Decoding.extract_pixels(array, 1 if gray else 3) == "mapped"
+    assert Decoding.extract_partial(path) == "mapped"
+
+
+def test_other_maxval_is_left_to_pil(cover, tmp_path):
+    path = str(tmp_path / "carrier.ppm")
+    write_pnm(path, (cover // 3).astype(np.uint8), maxval=100)
+    assert RawCarrier.open(path) is None
+    with pytest.raises(ValueError):
+        Encoding.encode_inplace(path, "mapped", mode="sequential")
@@ -0,0 +1,40 @@
+import cv2
+import numpy as np
+import pytest
+
+from Steganography import SampledMetrics, TiledMetrics
+
+
+@pytest.fixture
+def pair():
+    # blurred noise, with the right half of the copy disturbed so the
+    # windows do not all agree
+    rng = np.random.default_rng(0)
+    original = cv2.GaussianBlur(rng.integers(0, 256, (160, 200, 3)).astype(np.uint8), (7, 7), 2)
+    noise = rng.normal(0, 3, original.shape).round() * (np.arange(200)[None, :, None] > 100)
+    return original, np.clip(original + noise, 0, 255).astype(np.uint8)
+
+
+@pytest.mark.parametrize("strategy", SampledMetrics.STRATEGIES)
+def test_interval_coverage(pair, strategy):
+    exact = TiledMetrics(tile_size=64).compare(*pair)
+    seeds = 60
+    covered = {"mse": 0, "ssim": 0}
+    for seed in range(seeds):
+        result = SampledMetrics(window=16, samples=36, strategy=strategy, seed=seed).estimate(*pair)
+        assert not result["exact"]
+        for name in covered:
+            low, high = result["interval"][name]
+            assert low < high
+            covered[name] += low <= exact[name] <= high
+    # nominally 95%
+    assert all(count >= 0.85 * seeds for count in covered.values())
+
+
+def test_sample_covering_the_image_is_exact(pair):
+    exact = TiledMetrics(tile_size=64).compare(*pair)
+    # 256 windows of 64 x 64 read more pixels than the image holds
+    result = SampledMetrics(seed=1).estimate(*pair)
+    assert result["exact"]
+    assert result["mse"] == exact["mse"]
+    assert result["interval"]["ssim"] == (exact["ssim"], exact["ssim"])
@@ -0,0 +1,49 @@
+import json
+
+from JobQueue import InMemoryBroker, Job, Worker, submit
+
+
+def worker_for(handler, broker):
+    return Worker(broker, handlers={"work": handler}, max_attempts=3)
+
+
+def outcome(broker, queue):
+    delivery = broker.get(queue, timeout=0)
+    return None if delivery is None else json.loads(delivery.body)
+
+
+def test_result_is_published():
+    broker = InMemoryBroker()
+    submit(broker, [Job("work", {"value": 2})])
+    assert worker_for(lambda value: value * 2, broker).process_one(timeout=0)
+    result = outcome(broker, "stego_jobs.results")
+    assert (result["status"], result["result"]) == ("done", 4)
+
+
+def test_false_result_fails_without_retry():
+    broker = InMemoryBroker()
+    calls = []
+    submit(broker, [Job("work", {"value": 2})])
+    worker = worker_for(lambda value: calls.append(value) or False, broker)
+    assert worker.process_one(timeout=0)
+    assert not worker.process_one(timeout=0)
+    assert calls == [2]
+    assert outcome(broker, "stego_jobs.results") is None
+    assert outcome(broker, "stego_jobs.failed")["status"] == "failed"
+
+
+def test_exceptions_are_retried_then_failed():
+    broker = InMemoryBroker()
+    calls = []
+
+    def handler(value):
+        calls.append(value)
+        raise OSError("flaky")
+
+    submit(broker, [Job("work", {"value": 2})])
+    worker = worker_for(handler, broker)
+    while worker.process_one(timeout=0):
+        pass
+    assert len(calls) == 3
+    failed = outcome(broker, "stego_jobs.failed")
+    assert (failed["status"], failed["attempts"]) == ("failed", 3)